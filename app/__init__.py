@@ -4,21 +4,50 @@ from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from config import Config
 from flask_cors import CORS
+from app.cache import Cache
+from app.replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
+cache = Cache()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    from app import database, replicas
+    database.configure(app)
+    replicas.init_app(app)
     db.init_app(app)
+    database.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    cache.init_app(app)
     
     # Enable CORS for all routes and origins (for development)
-    CORS(app)
+    from app.pagination import NEXT_CURSOR_HEADER
+    CORS(app, expose_headers=[NEXT_CURSOR_HEADER])
+    
+    from app import json_provider
+    json_provider.init_app(app)
+    
+    # Registered before compression so its after_request sees the final body
+    from app import metrics
+    metrics.init_app(app)
+    
+    from app import slow_queries
+    slow_queries.init_app(app)
+    
+    # Compress JSON responses and answer repeat requests with 304
+    from app import compression
+    compression.init_app(app)
+    
+    from app.serializers import InvalidFields
+    
+    @app.errorhandler(InvalidFields)
+    def invalid_fields(e):
+        return jsonify({'message': str(e)}), 400
     
     # Root route
     @app.route('/')
@@ -41,6 +70,15 @@ def create_app(config_class=Config):
     app.register_blueprint(search.bp)
     app.register_blueprint(reports.bp)
     
+    from app.commands import matches_cli, search_cli, cache_cli, photos_cli, bench_cli, queries_cli, seed_command
+    app.cli.add_command(matches_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(cache_cli)
+    app.cli.add_command(photos_cli)
+    app.cli.add_command(bench_cli)
+    app.cli.add_command(queries_cli)
+    app.cli.add_command(seed_command)
+    
     return app
 
-from app.models import User, Profile, Favourite, Report
\ No newline at end of file
+from app.models import User, Profile, ProfileMatch, Favourite, Report
\ No newline at end of file
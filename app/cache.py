@@ -0,0 +1,268 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity
+
+
+class NullBackend:
+    """Caches nothing; versions are kept so invalidation still works"""
+
+    def __init__(self):
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def clear(self):
+        pass
+
+    def get_versions(self, namespaces):
+        return [self.versions.get(ns, 0) for ns in namespaces]
+
+    def bump_versions(self, namespaces):
+        with self.lock:
+            for ns in namespaces:
+                self.versions[ns] = self.versions.get(ns, 0) + 1
+
+
+class MemoryBackend(NullBackend):
+    """In-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries=1024):
+        super().__init__()
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (time.time() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SQLiteBackend:
+    """Cache shared by every worker on the host, stored in a SQLite file.
+
+    Namespace versions live in the same file, so a write committed by one
+    worker invalidates the entries every other worker would read.
+    """
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.sets = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires)')
+            conn.execute('CREATE TABLE IF NOT EXISTS versions (namespace TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or getattr(self.local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires >= ?', (key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, timeout):
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + timeout)
+        )
+        self.sets += 1
+        if self.sets % 100 == 0:
+            self._prune(conn)
+
+    def _prune(self, conn):
+        conn.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+        conn.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache')
+
+    def get_versions(self, namespaces):
+        placeholders = ','.join('?' * len(namespaces))
+        rows = self._connect().execute(
+            f'SELECT namespace, version FROM versions WHERE namespace IN ({placeholders})', list(namespaces)
+        ).fetchall()
+        found = dict(rows)
+        return [found.get(ns, 0) for ns in namespaces]
+
+    def bump_versions(self, namespaces):
+        self._connect().executemany(
+            'INSERT INTO versions (namespace, version) VALUES (?, 1) '
+            'ON CONFLICT (namespace) DO UPDATE SET version = version + 1',
+            [(ns,) for ns in namespaces]
+        )
+
+
+class TieredBackend:
+    """An in-process LRU in front of a shared backend.
+
+    Keys embed the namespace versions read from the shared backend, so a
+    stale local entry is simply never looked up again.
+    """
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                # Expiry is enforced by the shared tier; keep local copies briefly
+                self.local.set(key, value, 5)
+        return value
+
+    def set(self, key, value, timeout):
+        self.local.set(key, value, min(timeout, 5))
+        self.shared.set(key, value, timeout)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def get_versions(self, namespaces):
+        return self.shared.get_versions(namespaces)
+
+    def bump_versions(self, namespaces):
+        self.shared.bump_versions(namespaces)
+
+
+class Cache:
+    """Response cache for hot read endpoints.
+
+    Entries are grouped into namespaces named after the tables they read.
+    Committing a write to a table bumps its namespace version, which changes
+    the key of every entry depending on it.
+    """
+
+    def __init__(self):
+        self.backend = NullBackend()
+        self.hits = 0
+        self.misses = 0
+        self.default_timeout = 60
+
+    def init_app(self, app):
+        kind = app.config.get('CACHE_BACKEND', 'memory')
+        max_entries = app.config.get('CACHE_MAX_ENTRIES', 1024)
+        if kind == 'sqlite':
+            shared = SQLiteBackend(app.config['CACHE_SQLITE_PATH'], max_entries)
+            self.backend = TieredBackend(MemoryBackend(max_entries), shared)
+        elif kind == 'memory':
+            self.backend = MemoryBackend(max_entries)
+        elif kind == 'null':
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND: {kind}')
+        self.default_timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+
+        from app.events import tables_committed
+        tables_committed.connect(self._invalidate, weak=False)
+
+    def _invalidate(self, sender, tables):
+        self.backend.bump_versions(sorted(tables))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+    def make_key(self, namespaces, per_user):
+        versions = self.backend.get_versions(namespaces)
+        parts = [request.endpoint, request.full_path, repr(versions)]
+        if per_user:
+            parts.append(str(get_jwt_identity()))
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    def memoize(self, parts, namespaces, compute, timeout=None):
+        """Return the cached value for `parts`, calling `compute` on a miss.
+
+        Returns the value and whether it came from the cache.
+        """
+        versions = self.backend.get_versions(namespaces)
+        key = hashlib.sha1(repr((parts, versions)).encode()).hexdigest()
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value, True
+
+        self.misses += 1
+        value = compute()
+        self.backend.set(key, value, timeout or self.default_timeout)
+        return value, False
+
+    def cached(self, *namespaces, timeout=None, per_user=False):
+        """Cache a view's successful JSON responses.
+
+        `namespaces` are the tables the view reads; `per_user` adds the
+        caller's identity to the key for views whose output depends on it.
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                key = self.make_key(namespaces, per_user)
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    status, headers, body = entry
+                    response = current_app.response_class(body, status=status, headers=headers)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self.misses += 1
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    headers = [(k, v) for k, v in response.headers.items() if k.lower() != 'content-length']
+                    self.backend.set(key, (200, headers, response.get_data()), timeout or self.default_timeout)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+
+            return decorated_function
+
+        return decorator
@@ -0,0 +1,226 @@
+import json
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from app import cache, db, serializers
+from app.models import Profile, User
+from app.fulltext import rebuild_fulltext_index
+from app.matching import MatchIndex, loop_matches, match_query, rebuild_profile_matches, stored_match_query
+from app.seeding import PASSWORD, SEED, DatabaseNotEmpty, seed_database
+from app.slow_queries import normalize, read_log
+from app.uploads import make_variants, original_filename, upload_dir
+
+matches_cli = AppGroup('matches', help='Inspect and maintain profile matching.')
+search_cli = AppGroup('search', help='Maintain the profile full-text index.')
+cache_cli = AppGroup('cache', help='Manage the response cache.')
+photos_cli = AppGroup('photos', help='Maintain uploaded profile photos.')
+bench_cli = AppGroup('bench', help='Micro-benchmarks for hot code paths.')
+queries_cli = AppGroup('queries', help='Inspect slow SQL statements.')
+
+
+@matches_cli.command('check')
+@click.option('--limit', default=200, show_default=True, help='Number of profiles to check.')
+def check_matches(limit):
+    """Compare the vectorized and SQL engines against the reference loop and time them."""
+    candidates = Profile.query.order_by(Profile.id).all()
+
+    start = time.perf_counter()
+    index = MatchIndex()
+    build_time = time.perf_counter() - start
+
+    loop_time = vector_time = sql_time = 0.0
+    mismatches = 0
+    for profile in candidates[:limit]:
+        start = time.perf_counter()
+        others = [p for p in candidates if p.user_id_fk != profile.user_id_fk]
+        expected = [p.id for p in loop_matches(profile, others)]
+        loop_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = index.match_ids(profile, profile.user_id_fk)
+        vector_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        from_sql = [p.id for p in match_query(profile, profile.user_id_fk).all()]
+        sql_time += time.perf_counter() - start
+
+        for engine, result in (('vectorized', actual), ('sql', from_sql)):
+            if result != expected:
+                mismatches += 1
+                click.echo(f'Profile {profile.id} ({engine}): expected {expected}, got {result}', err=True)
+
+    checked = min(limit, len(candidates))
+    click.echo(f'Checked {checked} profiles against {len(index)} candidates')
+    click.echo(f'Index build: {build_time * 1000:.1f} ms')
+    if checked:
+        click.echo(f'Loop:       {loop_time / checked * 1000:.3f} ms/query')
+        click.echo(f'Vectorized: {vector_time / checked * 1000:.3f} ms/query')
+        click.echo(f'SQL:        {sql_time / checked * 1000:.3f} ms/query')
+    if mismatches:
+        raise click.ClickException(f'{mismatches} engine results differed from the reference loop')
+    click.echo('All results match')
+
+
+@matches_cli.command('rebuild')
+@click.option('--verify/--no-verify', default=True, show_default=True,
+              help='Check every stored match list against the SQL engine afterwards.')
+def rebuild_matches(verify):
+    """Recompute the profile_matches table from scratch."""
+    start = time.perf_counter()
+    count = rebuild_profile_matches()
+    click.echo(f'Stored {count} match rows in {time.perf_counter() - start:.2f} s')
+    if not verify:
+        return
+
+    mismatches = 0
+    for profile in Profile.query.order_by(Profile.id).yield_per(1000):
+        expected = [p.id for p in match_query(profile, profile.user_id_fk)]
+        stored = [p.id for p in stored_match_query(profile)]
+        if stored != expected:
+            mismatches += 1
+            click.echo(f'Profile {profile.id}: expected {expected}, stored {stored}', err=True)
+    if mismatches:
+        raise click.ClickException(f'{mismatches} profiles have stale stored matches')
+    click.echo('Stored matches agree with the live algorithm')
+
+
+@search_cli.command('reindex')
+def reindex_search():
+    """Rebuild the full-text index from the profiles and users tables."""
+    start = time.perf_counter()
+    rebuild_fulltext_index()
+    click.echo(f'Reindexed {Profile.query.count()} profiles in {time.perf_counter() - start:.2f} s')
+
+
+@cache_cli.command('clear')
+def clear_cache():
+    """Drop every cached response."""
+    cache.backend.clear()
+    click.echo('Cache cleared')
+
+
+@photos_cli.command('variants')
+def build_photo_variants():
+    """Make any missing thumbnail and medium variants, e.g. for older uploads."""
+    folder = upload_dir()
+    if not os.path.isdir(folder):
+        click.echo('No uploads yet')
+        return
+    written = failed = 0
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith('.part') or original_filename(filename):
+            continue
+        try:
+            written += len(make_variants(folder, filename))
+        except Exception as e:
+            failed += 1
+            click.echo(f'{filename}: {e}', err=True)
+    click.echo(f'Wrote {written} variants')
+    if failed:
+        raise click.ClickException(f'{failed} photos could not be resized')
+
+
+@bench_cli.command('serializers')
+@click.option('--repeat', default=3, show_default=True, help='Runs per path; the best is reported.')
+def bench_serializers(repeat):
+    """Compare ORM + to_dict() serialization with the column-tuple fast path."""
+    cases = [
+        ('users', serializers.user, User.query.order_by(User.id)),
+        ('profiles', serializers.profile, Profile.query.order_by(Profile.id)),
+        ('profiles+name', serializers.profile_with_name, Profile.query.order_by(Profile.id)),
+    ]
+
+    def best_of(run):
+        times = []
+        for _ in range(repeat):
+            db.session.expunge_all()
+            start = time.perf_counter()
+            output = run()
+            times.append(time.perf_counter() - start)
+        return output, min(times)
+
+    for name, serializer, query in cases:
+        def orm_path():
+            return json.dumps(serializer.many(serializer.load(query).all()), sort_keys=True)
+
+        def fast_path():
+            return current_app.json.dumps(serializer.from_rows(serializer.select(query).all()))
+
+        before, orm_time = best_of(orm_path)
+        after, fast_time = best_of(fast_path)
+        rows = len(json.loads(before))
+        # Same dicts, so the same bytes from the same encoder
+        if json.dumps(json.loads(after), sort_keys=True) != before:
+            raise click.ClickException(f'{name}: fast path output differs from to_dict()')
+        click.echo(f'{name:14} {rows:7} rows  ORM {rows / orm_time:10.0f} rows/s  '
+                   f'fast {rows / fast_time:10.0f} rows/s  ({orm_time / fast_time:.1f}x)')
+    click.echo(f'JSON encoder: {type(current_app.json).__name__}')
+
+
+@queries_cli.command('slow')
+@click.option('--top', default=20, show_default=True, help='Number of fingerprints to show.')
+@click.option('--endpoint', default=None, help='Only statements issued by this endpoint.')
+def slow_queries(top, endpoint):
+    """Group the slow-query log by statement fingerprint, most total time first."""
+    path = current_app.config.get('SLOW_QUERY_LOG')
+    if not path:
+        raise click.ClickException('SLOW_QUERY_LOG is not set')
+    groups = {}
+    for entry in read_log(path, current_app.config['SLOW_QUERY_LOG_BACKUPS']):
+        if endpoint and entry.get('endpoint') != endpoint:
+            continue
+        group = groups.setdefault(entry['fingerprint'], {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'endpoints': set(), 'origins': set(),
+            'statement': normalize(entry['statement']), 'plan': None,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        group['endpoints'].add(entry.get('endpoint') or '?')
+        group['origins'].add(entry.get('origin') or '?')
+        group['plan'] = entry.get('plan') or group['plan']
+    if not groups:
+        click.echo('No slow queries logged')
+        return
+    
+    ranked = sorted(groups.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+    for key, group in ranked[:top]:
+        click.echo(f"{key}  {group['count']}x  total {group['total_ms']:.1f} ms  "
+                   f"avg {group['total_ms'] / group['count']:.1f} ms  max {group['max_ms']:.1f} ms")
+        click.echo(f"  endpoints: {', '.join(sorted(group['endpoints']))}")
+        click.echo(f"  from: {', '.join(sorted(group['origins']))}")
+        click.echo(f"  {group['statement']}")
+        for line in group['plan'] or ():
+            click.echo(f'    {line}')
+
+
+@click.command('seed')
+@click.option('--users', default=10000, show_default=True, type=click.IntRange(min=2),
+              help='Users to create, each with a profile.')
+@click.option('--favourites', default=10.0, show_default=True, help='Average favourites per user.')
+@click.option('--reports', default=0.01, show_default=True, help='Reports per user.')
+@click.option('--extra-profiles', default=0.0, show_default=True, help='Fraction of users with a second profile.')
+@click.option('--alpha', default=0.8, show_default=True, help='Power-law exponent of favourite popularity.')
+@click.option('--seed', default=SEED, show_default=True, help='Random seed; the same seed gives the same data.')
+@click.option('--password', default=PASSWORD, show_default=True, help='Password of every generated user.')
+@click.option('--replace', is_flag=True,
+              help='Delete existing users, profiles, favourites, reports and stored matches first.')
+@with_appcontext
+def seed_command(users, favourites, reports, extra_profiles, alpha, seed, password, replace):
+    """Fill the database with synthetic users for development and benchmarks.
+
+    With MATCH_ENGINE=table the stored matches are rebuilt afterwards (like
+    `flask matches rebuild`), which takes minutes beyond ~20k profiles.
+    """
+    try:
+        counts, elapsed = seed_database(
+            users, favourites=favourites, reports=reports, extra_profiles=extra_profiles, alpha=alpha,
+            seed=seed, password=password, replace=replace, progress=lambda message: click.echo(f'  {message}'),
+        )
+    except DatabaseNotEmpty as e:
+        raise click.ClickException(f'{e}; use --replace to delete them first')
+    rows = sum(counts.values())
+    click.echo(f"Seeded {', '.join(f'{n} {table}' for table, n in counts.items())}")
+    click.echo(f'{rows} rows in {elapsed:.1f} s ({rows / elapsed:,.0f} rows/s); users log in as user<id> / {password}')
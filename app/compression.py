@@ -0,0 +1,53 @@
+import gzip
+import hashlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json'}
+
+
+def _encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def _compress(data, encoding, level):
+    if encoding == 'br':
+        # Brotli quality runs 0-11; keep it proportional to the gzip level
+        return brotli.compress(data, quality=min(11, level + 2))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def process_response(response, app):
+    """Add a weak ETag to JSON responses, answer If-None-Match with 304 and
+    compress bodies of at least COMPRESS_MIN_SIZE bytes"""
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200 \
+            or response.is_streamed or response.mimetype not in COMPRESSIBLE_MIMETYPES \
+            or 'Content-Encoding' in response.headers:
+        return response
+
+    data = response.get_data()
+    if 'ETag' not in response.headers:
+        response.set_etag(hashlib.sha1(data).hexdigest(), weak=True)
+        # Let browsers keep the body but revalidate it on every poll
+        if not response.cache_control:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    response.make_conditional(request)
+    if response.status_code == 304 or len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = request.accept_encodings.best_match(_encodings())
+    if encoding is None:
+        return response
+    response.set_data(_compress(data, encoding, app.config['COMPRESS_LEVEL']))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    app.after_request(lambda response: process_response(response, app))
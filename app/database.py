@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from app import db
+
+# A child of the Flask app's logger, so it shares its handlers
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """Counts connection checkouts and how long callers waited for them"""
+
+    # Upper bounds (seconds) of the checkout wait histogram buckets
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.wait_buckets = [0] * len(self.BUCKETS)
+
+    def observe(self, wait, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            for i, bound in enumerate(self.BUCKETS):
+                if wait <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': self.wait_total,
+                'wait_seconds_max': self.wait_max,
+                'wait_buckets': list(zip(self.BUCKETS, self.wait_buckets)),
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool recording how long each checkout waited for a connection"""
+
+    slow_wait = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_metrics.observe(time.perf_counter() - start, timed_out=True)
+            raise
+        wait = time.perf_counter() - start
+        pool_metrics.observe(wait)
+        if self.slow_wait is not None and wait > self.slow_wait:
+            logger.warning('Waited %.3f s for a database connection (%s)', wait, self.status())
+        return connection
+
+
+def engine_options(config):
+    """SQLAlchemy engine options for the configured database URL"""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    sqlite = url.get_backend_name() == 'sqlite'
+    if sqlite and _in_memory(url):
+        return options  # a single shared connection; there's no pool to tune
+
+    options.setdefault('poolclass', TimedQueuePool)
+    options.setdefault('pool_size', config['DB_POOL_SIZE'])
+    options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+    if sqlite:
+        # sqlite3's own timeout is its busy handler; PRAGMA busy_timeout is set too
+        options.setdefault('connect_args', {}).setdefault('timeout', config['SQLITE_BUSY_TIMEOUT'] / 1000)
+    else:
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+    return options
+
+
+def _in_memory(url):
+    return url.database in (None, '', ':memory:')
+
+
+def _sqlite_pragmas(config):
+    pragmas = [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return set_pragmas
+
+
+def configure(app):
+    """Derive SQLALCHEMY_ENGINE_OPTIONS; call before db.init_app"""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    TimedQueuePool.slow_wait = app.config.get('DB_POOL_SLOW_WAIT')
+
+
+def init_app(app):
+    """Hook per-connection setup onto the app's engine; call after db.init_app"""
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite' and not _in_memory(engine.url):
+            event.listen(engine, 'connect', _sqlite_pragmas(app.config))
+
+
+def pool_status():
+    """Current state of the app's connection pool plus checkout metrics"""
+    pool = db.engine.pool
+    status = pool_metrics.snapshot()
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            checked_in=pool.checkedin(),
+        )
+    status['dialect'] = db.engine.dialect.name
+    return status
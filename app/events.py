@@ -0,0 +1,38 @@
+from blinker import Namespace
+from sqlalchemy import event
+from app import db
+
+_signals = Namespace()
+
+# Sent after a commit with `tables`, the names of the tables the committed
+# transaction wrote to through the ORM (including bulk query updates/deletes)
+tables_committed = _signals.signal('tables-committed')
+
+
+def _changed_tables(session):
+    return session.info.setdefault('changed_tables', set())
+
+
+@event.listens_for(db.session, 'before_flush')
+def _track_flushed_writes(session, flush_context, instances):
+    for obj in session.new | session.dirty | session.deleted:
+        _changed_tables(session).add(obj.__table__.name)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk_writes(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert) \
+            and orm_execute_state.bind_mapper is not None:
+        _changed_tables(orm_execute_state.session).add(orm_execute_state.bind_mapper.local_table.name)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _send_tables_committed(session):
+    tables = session.info.pop('changed_tables', None)
+    if tables:
+        tables_committed.send(session, tables=frozenset(tables))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _reset_on_rollback(session):
+    session.info.pop('changed_tables', None)
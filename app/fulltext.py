@@ -0,0 +1,85 @@
+import re
+from app import db
+from app.models import Profile
+
+# Full-text index over each profile's owner name, description and biography.
+# On SQLite this is an FTS5 table keyed by rowid = profiles.id; on Postgres a
+# table of tsvectors with a GIN index. Both are kept in sync by the triggers
+# created in the add_profile_fulltext_index migration.
+FTS_TABLE = 'profiles_fts'
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(text):
+    """Split user input into plain word tokens, dropping any query syntax"""
+    return _TERM_RE.findall(text or '')[:16]
+
+
+def _sqlite_match(terms, column=None):
+    prefix = f'{column} : ' if column else ''
+    return prefix + '(' + ' '.join(f'"{t}"*' for t in terms) + ')'
+
+
+def _postgres_query(terms, weight=''):
+    return ' & '.join(f'{t}:*{weight}' for t in terms)
+
+
+def ranked_ids(text, column=None):
+    """Subquery of (profile_id, rank) for profiles matching every term in `text`.
+
+    Terms are prefix-matched. `column` restricts matching to 'name',
+    otherwise all indexed fields are searched. Higher rank is more relevant.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return None
+
+    if db.engine.dialect.name == 'postgresql':
+        # Name lexemes carry weight A, so ':*A' restricts a term to the name.
+        # ts_rank is float4; as float8 the rank survives a round trip through
+        # a page cursor unchanged, so keyset comparisons on it are exact
+        stmt = db.text(
+            f"SELECT profile_id, ts_rank(document, to_tsquery('simple', :query))::float8 AS rank "
+            f"FROM {FTS_TABLE} WHERE document @@ to_tsquery('simple', :query)"
+        ).bindparams(query=_postgres_query(terms, 'A' if column == 'name' else ''))
+    else:
+        # bm25() is lower for better matches, so negate it
+        stmt = db.text(
+            f"SELECT rowid AS profile_id, -bm25({FTS_TABLE}) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :query"
+        ).bindparams(query=_sqlite_match(terms, column))
+
+    return stmt.columns(profile_id=db.Integer, rank=db.Float).subquery(f'fts_{column or "all"}')
+
+
+def apply_fulltext(query, text, column=None):
+    """Restrict a Profile query to full-text matches.
+
+    Returns the query and its relevance column, for the caller to order by.
+    """
+    fts = ranked_ids(text, column)
+    if fts is None:
+        # Nothing searchable in the input, so nothing can match
+        return query.filter(db.false()), db.literal(0.0, db.Float)
+    return query.join(fts, fts.c.profile_id == Profile.id), fts.c.rank
+
+
+def rebuild_fulltext_index():
+    """Repopulate the index from the profiles and users tables"""
+    db.session.execute(db.text(f'DELETE FROM {FTS_TABLE}'))
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text(
+            f"INSERT INTO {FTS_TABLE} (profile_id, document) "
+            f"SELECT p.id, setweight(to_tsvector('simple', u.name), 'A') || "
+            f"setweight(to_tsvector('simple', p.description), 'B') || "
+            f"setweight(to_tsvector('simple', p.biography), 'C') "
+            f"FROM profiles p JOIN users u ON u.id = p.user_id_fk"
+        ))
+    else:
+        db.session.execute(db.text(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, biography) "
+            f"SELECT p.id, u.name, p.description, p.biography "
+            f"FROM profiles p JOIN users u ON u.id = p.user_id_fk"
+        ))
+    db.session.commit()
@@ -0,0 +1,35 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is the fallback
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON provider with encoding done by orjson.
+
+    Keys are sorted like the default provider's, and dates, dataclasses and
+    other non-native values still go through its `default`, so responses
+    keep the same shape. Pretty-printed or otherwise customised dumps fall
+    back to the standard library.
+    """
+
+    options = 0 if orjson is None else (
+        orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.keys() <= {'separators', 'sort_keys'} and kwargs.get('sort_keys', True):
+            try:
+                return orjson.dumps(obj, default=self.default, option=self.options).decode()
+            except TypeError:
+                pass  # e.g. integers wider than 64 bits
+        return super().dumps(obj, **kwargs)
+
+
+def init_app(app):
+    """Use orjson for JSON responses when it is installed"""
+    if orjson is not None and app.config.get('JSON_USE_ORJSON', True):
+        app.json = OrjsonProvider(app)
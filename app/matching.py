@@ -0,0 +1,328 @@
+import heapq
+import threading
+import time
+import numpy as np
+from flask import current_app
+from app import db
+from app.events import tables_committed
+from app.models import Profile, ProfileMatch
+
+# Fields compared for equality when scoring a candidate
+CATEGORICAL_FIELDS = ['fav_cuisine', 'fav_colour', 'fav_school_subject']
+BOOLEAN_FIELDS = ['political', 'religious', 'family_oriented']
+MIN_MATCHED_FIELDS = 3
+
+# Widens the indexed height range so float rounding never drops a candidate
+HEIGHT_SLACK = 0.001
+
+# Scores are compared as integers in units of 1/SCORE_SCALE so ranking and
+# cursors are exact across engines
+SCORE_SCALE = 10000
+
+# SQLite's default limit on bound parameters is 32766, stay well below it
+IN_CHUNK_SIZE = 900
+
+
+def count_matched_fields(profile, p):
+    return sum(getattr(profile, field) == getattr(p, field) for field in CATEGORICAL_FIELDS + BOOLEAN_FIELDS)
+
+
+def loop_matches(profile, candidates):
+    """Reference implementation: score each candidate in a Python loop"""
+    matches = []
+    for p in candidates:
+        age_diff = abs(profile.birth_year - p.birth_year)
+        if age_diff > 5:
+            continue
+
+        height_diff = abs(profile.height - p.height)
+        if height_diff < 3 or height_diff > 10:
+            continue
+
+        if count_matched_fields(profile, p) >= MIN_MATCHED_FIELDS:
+            matches.append(p)
+    return matches
+
+
+def score_key(profile, birth_year, height, matched_fields):
+    """Similarity of a match in SCORE_SCALE units.
+
+    One point per matched field, plus up to one point each for closeness in
+    age (0-5 years apart) and height (3-10 apart).
+    """
+    age_closeness = (5 - abs(profile.birth_year - birth_year)) / 5
+    height_closeness = (10 - abs(profile.height - height)) / 7
+    return round((matched_fields + age_closeness + height_closeness) * SCORE_SCALE)
+
+
+def _after(key, profile_id, cursor):
+    """True if (key, profile_id) ranks after the cursor: score desc, id asc"""
+    return cursor is None or key < cursor[0] or (key == cursor[0] and profile_id > cursor[1])
+
+
+def top_k(scored, k, cursor=None):
+    """Bounded selection of the k best (key, id) pairs ranked after `cursor`"""
+    candidates = ((key, pid) for key, pid in scored if _after(key, pid, cursor))
+    return heapq.nsmallest(k, candidates, key=lambda c: (-c[0], c[1]))
+
+
+class MatchIndex:
+    """Columnar copy of the profile attributes used for matching.
+
+    Categorical fields are stored as integer codes so the whole candidate
+    set can be scored with a handful of vectorised comparisons.
+    """
+
+    def __init__(self):
+        columns = [Profile.id, Profile.user_id_fk, Profile.birth_year, Profile.height]
+        columns += [getattr(Profile, f) for f in CATEGORICAL_FIELDS + BOOLEAN_FIELDS]
+        rows = db.session.query(*columns).order_by(Profile.id).all()
+        self.built_at = time.monotonic()
+
+        n = len(rows)
+        self.ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        self.user_ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=n)
+        self.birth_years = np.fromiter((r[2] for r in rows), dtype=np.int64, count=n)
+        self.heights = np.fromiter((r[3] for r in rows), dtype=np.float64, count=n)
+
+        self.codes = {}
+        self.categoricals = {}
+        for offset, field in enumerate(CATEGORICAL_FIELDS, start=4):
+            mapping = {}
+            self.categoricals[field] = np.fromiter(
+                (mapping.setdefault(r[offset], len(mapping)) for r in rows),
+                dtype=np.int32, count=n
+            )
+            self.codes[field] = mapping
+
+        self.booleans = {}
+        for offset, field in enumerate(BOOLEAN_FIELDS, start=4 + len(CATEGORICAL_FIELDS)):
+            self.booleans[field] = np.fromiter((bool(r[offset]) for r in rows), dtype=np.bool_, count=n)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def match_scores(self, profile, exclude_user_id):
+        """Return (ids, matched_fields) arrays for profiles matching `profile`, in id order"""
+        mask = self.user_ids != int(exclude_user_id)
+        mask &= np.abs(self.birth_years - profile.birth_year) <= 5
+        height_diff = np.abs(self.heights - profile.height)
+        mask &= (height_diff >= 3) & (height_diff <= 10)
+
+        matched_fields = np.zeros(len(self.ids), dtype=np.int8)
+        for field, column in self.categoricals.items():
+            code = self.codes[field].get(getattr(profile, field), -1)
+            matched_fields += column == code
+        for field, column in self.booleans.items():
+            matched_fields += column == bool(getattr(profile, field))
+        mask &= matched_fields >= MIN_MATCHED_FIELDS
+
+        return self.ids[mask], matched_fields[mask]
+
+    def match_ids(self, profile, exclude_user_id):
+        """Return the ids of profiles matching `profile`, in id order"""
+        return self.match_scores(profile, exclude_user_id)[0].tolist()
+
+    def top_matches(self, profile, exclude_user_id, k, cursor=None):
+        """Vectorised equivalent of top_k over this profile's matches"""
+        ids, matched_fields = self.match_scores(profile, exclude_user_id)
+        positions = np.searchsorted(self.ids, ids)
+        age_closeness = (5 - np.abs(self.birth_years[positions] - profile.birth_year)) / 5
+        height_closeness = (10 - np.abs(self.heights[positions] - profile.height)) / 7
+        keys = np.rint((matched_fields + age_closeness + height_closeness) * SCORE_SCALE).astype(np.int64)
+
+        if cursor is not None:
+            after = (keys < cursor[0]) | ((keys == cursor[0]) & (ids > cursor[1]))
+            ids, keys = ids[after], keys[after]
+
+        # Sort on a single composite key: score descending, then id ascending
+        order_keys = -keys * (1 << 40) + ids
+        if len(order_keys) > k:
+            selected = np.argpartition(order_keys, k - 1)[:k]
+        else:
+            selected = np.arange(len(order_keys))
+        selected = selected[np.argsort(order_keys[selected])]
+        return list(zip(keys[selected].tolist(), ids[selected].tolist()))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_match_index():
+    """Return this worker's MatchIndex, rebuilding it once it is older than
+    MATCH_INDEX_TTL seconds so writes made by other workers are picked up"""
+    global _index
+    ttl = current_app.config.get('MATCH_INDEX_TTL', 30)
+    index = _index
+    if index is None or time.monotonic() - index.built_at > ttl:
+        with _index_lock:
+            if _index is None or time.monotonic() - _index.built_at > ttl:
+                _index = MatchIndex()
+            index = _index
+    return index
+
+
+def invalidate_match_index():
+    global _index
+    _index = None
+
+
+def load_profiles(ids, load=None):
+    """Load profiles by id preserving id order, chunking the IN clause.
+
+    `load` optionally adds loader options to the query, e.g. a serializer's.
+    """
+    query = load(Profile.query) if load is not None else Profile.query
+    profiles = []
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        chunk = ids[start:start + IN_CHUNK_SIZE]
+        profiles.extend(query.filter(Profile.id.in_(chunk)).order_by(Profile.id).all())
+    return profiles
+
+
+def _matched_fields_expression(profile):
+    return sum(
+        db.case((getattr(Profile, field) == getattr(profile, field), 1), else_=0)
+        for field in CATEGORICAL_FIELDS + BOOLEAN_FIELDS
+    )
+
+
+def _match_filters(profile, exclude_user_id):
+    """SQL match predicates for `profile`.
+
+    The birth year and height windows are expressed as ranges so the
+    (birth_year, height) index can be used; the exact height check is kept
+    alongside so results agree with the Python engines at the boundaries.
+    """
+    height_diff = db.func.abs(Profile.height - profile.height)
+    return (
+        Profile.birth_year.between(profile.birth_year - 5, profile.birth_year + 5),
+        Profile.height.between(profile.height - 10 - HEIGHT_SLACK, profile.height + 10 + HEIGHT_SLACK),
+        height_diff >= 3,
+        height_diff <= 10,
+        Profile.user_id_fk != int(exclude_user_id),
+        _matched_fields_expression(profile) >= MIN_MATCHED_FIELDS
+    )
+
+
+def match_query(profile, exclude_user_id):
+    """Build a query evaluating the match predicates in the database"""
+    return Profile.query.filter(*_match_filters(profile, exclude_user_id)).order_by(Profile.id)
+
+
+def match_pairs(profile):
+    """Return (match_profile_id, matched_fields) tuples for `profile`, computed in SQL"""
+    return db.session.query(Profile.id, _matched_fields_expression(profile))\
+        .filter(*_match_filters(profile, profile.user_id_fk))\
+        .order_by(Profile.id)\
+        .all()
+
+
+def refresh_profile_matches(profile):
+    """Recompute the stored match rows involving `profile`.
+
+    Matching is symmetric, so each pair is stored in both directions and
+    lookups only ever need the profile_id_fk index. The caller commits.
+    Only the 'table' engine reads these rows, so this does nothing under
+    any other MATCH_ENGINE; run `flask matches rebuild` when switching to it.
+    """
+    if current_app.config.get('MATCH_ENGINE', 'vectorized') != 'table':
+        return
+    db.session.flush()
+    ProfileMatch.query.filter(
+        (ProfileMatch.profile_id_fk == profile.id) | (ProfileMatch.match_profile_id_fk == profile.id)
+    ).delete(synchronize_session=False)
+
+    rows = []
+    for match_id, matched_fields in match_pairs(profile):
+        rows.append({'profile_id_fk': profile.id, 'match_profile_id_fk': match_id, 'matched_fields': matched_fields})
+        rows.append({'profile_id_fk': match_id, 'match_profile_id_fk': profile.id, 'matched_fields': matched_fields})
+    if rows:
+        db.session.execute(db.insert(ProfileMatch), rows)
+
+
+def delete_user_matches(user_id):
+    """Remove stored match rows involving any of the user's profiles"""
+    profile_ids = db.session.query(Profile.id).filter(Profile.user_id_fk == user_id)
+    ProfileMatch.query.filter(
+        ProfileMatch.profile_id_fk.in_(profile_ids) | ProfileMatch.match_profile_id_fk.in_(profile_ids)
+    ).delete(synchronize_session=False)
+
+
+def rebuild_profile_matches(batch_size=10000):
+    """Recompute the whole profile_matches table from the match index.
+
+    The table holds two rows per matching pair, so it grows with the square
+    of the profile count: about 6M rows for 20k profiles, taking minutes.
+    """
+    ProfileMatch.query.delete(synchronize_session=False)
+    index = MatchIndex()
+    rows = []
+    for profile in Profile.query.order_by(Profile.id).yield_per(1000):
+        ids, matched_fields = index.match_scores(profile, profile.user_id_fk)
+        rows.extend(
+            {'profile_id_fk': profile.id, 'match_profile_id_fk': match_id, 'matched_fields': n}
+            for match_id, n in zip(ids.tolist(), matched_fields.tolist())
+        )
+        if len(rows) >= batch_size:
+            db.session.execute(db.insert(ProfileMatch), rows)
+            rows = []
+    if rows:
+        db.session.execute(db.insert(ProfileMatch), rows)
+    db.session.commit()
+    return ProfileMatch.query.count()
+
+
+def stored_match_query(profile):
+    """Look up the precomputed matches for `profile`"""
+    return Profile.query.join(ProfileMatch, ProfileMatch.match_profile_id_fk == Profile.id)\
+        .filter(ProfileMatch.profile_id_fk == profile.id)\
+        .order_by(Profile.id)
+
+
+def _scored_candidates(engine, profile, current_user_id):
+    """Yield (key, id) for every match of `profile` using a non-vectorised engine"""
+    if engine == 'loop':
+        candidates = Profile.query.filter(Profile.user_id_fk != current_user_id).order_by(Profile.id).all()
+        for p in loop_matches(profile, candidates):
+            yield score_key(profile, p.birth_year, p.height, count_matched_fields(profile, p)), p.id
+        return
+
+    if engine == 'sql':
+        rows = db.session.query(Profile.id, Profile.birth_year, Profile.height, _matched_fields_expression(profile))\
+            .filter(*_match_filters(profile, current_user_id))
+    elif engine == 'table':
+        rows = db.session.query(Profile.id, Profile.birth_year, Profile.height, ProfileMatch.matched_fields)\
+            .join(ProfileMatch, ProfileMatch.match_profile_id_fk == Profile.id)\
+            .filter(ProfileMatch.profile_id_fk == profile.id)
+    else:
+        raise ValueError(f'Unknown MATCH_ENGINE: {engine}')
+    for profile_id, birth_year, height, matched_fields in rows:
+        yield score_key(profile, birth_year, height, matched_fields), profile_id
+
+
+def ranked_matches(profile, current_user_id, limit, cursor=None, load=None):
+    """Return one page of matches for `profile`, best first.
+
+    Gives a list of (Profile, score) pairs and the cursor for the next page,
+    or None when this is the last page. Only the profiles on the page are
+    loaded, through `load` if given (see load_profiles).
+    """
+    engine = current_app.config.get('MATCH_ENGINE', 'vectorized')
+    if engine == 'vectorized':
+        page = get_match_index().top_matches(profile, current_user_id, limit + 1, cursor)
+    else:
+        page = top_k(_scored_candidates(engine, profile, current_user_id), limit + 1, cursor)
+
+    next_cursor = list(page[limit - 1]) if len(page) > limit else None
+    page = page[:limit]
+    profiles = {p.id: p for p in load_profiles(sorted(pid for _, pid in page), load)}
+    return [(profiles[pid], key / SCORE_SCALE) for key, pid in page if pid in profiles], next_cursor
+
+
+# Keep the per-worker index in step with profile writes made through this worker
+@tables_committed.connect
+def _invalidate_on_profile_writes(sender, tables):
+    if Profile.__tablename__ in tables:
+        invalidate_match_index()
@@ -0,0 +1,235 @@
+import hmac
+import threading
+import time
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A metric family with a fixed set of label names, safe across threads"""
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labels, labels)} {_format_number(value)}' for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, *labels, value):
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-1] += value
+
+    def render(self):
+        with self.lock:
+            items = sorted((labels, list(entry)) for labels, entry in self.values.items())
+        lines = self.header()
+        for labels, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                le = (('le', _format_number(bound)),)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {_format_number(entry[-1])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, labels)} {cumulative}')
+        return lines
+
+
+# Metrics are per process; with several gunicorn workers each scrape sees one worker
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Time spent handling requests.', ('method', 'endpoint'))
+REQUESTS = Counter('http_requests_total', 'Requests handled.', ('method', 'endpoint', 'status'))
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body sizes (after compression).',
+                          ('endpoint',), SIZE_BUCKETS)
+IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests currently being handled.')
+REQUEST_QUERIES = Histogram('db_queries_per_request', 'SQL statements executed per request.',
+                            ('endpoint',), QUERY_COUNT_BUCKETS)
+DB_QUERIES = Counter('db_queries_total', 'SQL statements executed while handling requests.', ('endpoint',))
+DB_TIME = Counter('db_query_duration_seconds_total', 'Time spent executing SQL while handling requests.',
+                  ('endpoint',))
+
+REQUEST_METRICS = (REQUEST_LATENCY, REQUESTS, RESPONSE_SIZE, IN_FLIGHT, REQUEST_QUERIES, DB_QUERIES, DB_TIME)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _record_query(conn):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_queries += 1
+        g.metrics_db_time += elapsed
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    _record_query(conn)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _stop_failed_query_timer(context):
+    # after_cursor_execute doesn't fire for a failed statement, whose start
+    # would otherwise pair with the next statement's end
+    if context.connection is not None and context.execution_context is not None:
+        _record_query(context.connection)
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_db_time = 0.0
+    IN_FLIGHT.inc()
+
+
+def _after_request(response):
+    if 'metrics_start' not in g:
+        return response
+    endpoint = _endpoint()
+    REQUEST_LATENCY.observe(request.method, endpoint, value=time.perf_counter() - g.metrics_start)
+    REQUESTS.inc(request.method, endpoint, str(response.status_code))
+    if not response.is_streamed:
+        RESPONSE_SIZE.observe(endpoint, value=response.calculate_content_length() or 0)
+    REQUEST_QUERIES.observe(endpoint, value=g.metrics_queries)
+    DB_QUERIES.inc(endpoint, amount=g.metrics_queries)
+    DB_TIME.inc(endpoint, amount=g.metrics_db_time)
+    return response
+
+
+def _teardown_request(exc):
+    if g.pop('metrics_start', None) is not None:
+        IN_FLIGHT.dec()
+
+
+def _snapshot_lines():
+    """Gauges read from other subsystems when /metrics is scraped"""
+    from app import cache
+    from app.database import pool_status
+
+    lines = []
+    stats = cache.stats()
+    for name, help, value in (
+        ('cache_hits_total', 'Response and search cache hits.', stats['hits']),
+        ('cache_misses_total', 'Response and search cache misses.', stats['misses']),
+    ):
+        lines += [f'# HELP {name} {help}', f'# TYPE {name} counter', f'{name} {value}']
+
+    pool = pool_status()
+    lines += ['# HELP db_pool_checkout_wait_seconds Time spent waiting for a pooled connection.',
+              '# TYPE db_pool_checkout_wait_seconds histogram']
+    cumulative = 0
+    for bound, count in pool['wait_buckets']:
+        cumulative += count
+        lines.append(f'db_pool_checkout_wait_seconds_bucket{{le="{_format_number(bound)}"}} {cumulative}')
+    lines.append(f"db_pool_checkout_wait_seconds_sum {_format_number(pool['wait_seconds_total'])}")
+    lines.append(f'db_pool_checkout_wait_seconds_count {cumulative}')
+    lines += ['# HELP db_pool_checkout_timeouts_total Checkouts that gave up waiting for a connection.',
+              '# TYPE db_pool_checkout_timeouts_total counter',
+              f"db_pool_checkout_timeouts_total {pool['timeouts']}"]
+    for key, help in (('size', 'Configured pool size.'), ('checked_out', 'Connections in use.'),
+                      ('overflow', 'Connections opened beyond the pool size.')):
+        if key in pool:
+            lines += [f'# HELP db_pool_{key} {help}', f'# TYPE db_pool_{key} gauge', f'db_pool_{key} {pool[key]}']
+    return lines
+
+
+def render():
+    lines = []
+    for metric in REQUEST_METRICS:
+        lines += metric.render()
+    lines += _snapshot_lines()
+    return '\n'.join(lines) + '\n'
+
+
+def _metrics_view():
+    # Without a configured token the endpoint stays closed, and it answers
+    # 404 either way so scanners can't tell it exists
+    token = current_app.config.get('METRICS_TOKEN')
+    supplied = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+        abort(404)
+    return Response(render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def init_app(app):
+    """Instrument every request and serve the results at /metrics to holders of METRICS_TOKEN"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', _metrics_view)
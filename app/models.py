@@ -1,5 +1,6 @@
 from datetime import datetime
 from app import db
+from app.uploads import photo_urls
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User(db.Model):
@@ -12,6 +13,10 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     photo = db.Column(db.String(200))
     date_joined = db.Column(db.DateTime, default=datetime.utcnow)
+    # Denormalized from profiles.is_complete, kept up to date by Profile.check_completeness()
+    profile_complete = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false(), index=True)
+    # Number of users who favourited this user, maintained alongside the favorites table
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
     
     # Relationships
     profiles = db.relationship('Profile', backref='user', lazy='dynamic')
@@ -30,7 +35,7 @@ class User(db.Model):
     
     def has_complete_profile(self):
         """Check if user has at least one complete profile"""
-        return self.profiles.filter_by(is_complete=True).first() is not None
+        return bool(self.profile_complete)
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -60,7 +65,13 @@ class Profile(db.Model):
     is_complete = db.Column(db.Boolean, default=False)
     photo = db.Column(db.String(255))
     
+    __table_args__ = (
+        db.Index('ix_profiles_birth_year_height', 'birth_year', 'height'),
+        db.Index('ix_profiles_user_id_fk', 'user_id_fk'),
+    )
+    
     def to_dict(self):
+        photos = photo_urls(self.photo)
         return {
             'id': self.id,
             'user_id': self.user_id_fk,
@@ -79,7 +90,9 @@ class Profile(db.Model):
             'family_oriented': self.family_oriented,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'is_complete': self.is_complete,
-            'photo': self.photo
+            'photo': self.photo,
+            'photo_thumb': photos['thumb'],
+            'photo_medium': photos['medium']
         }
     
     def check_completeness(self):
@@ -92,8 +105,23 @@ class Profile(db.Model):
             self.religious is not None, self.family_oriented is not None
         ]
         self.is_complete = all(required_fields)
+        
+        user = db.session.get(User, self.user_id_fk)
+        if user is not None:
+            if self.is_complete:
+                user.profile_complete = True
+            else:
+                others = user.profiles.filter(Profile.is_complete.is_(True), Profile.id != self.id)
+                user.profile_complete = others.first() is not None
         return self.is_complete
 
+class ProfileMatch(db.Model):
+    __tablename__ = 'profile_matches'
+    
+    profile_id_fk = db.Column(db.Integer, db.ForeignKey('profiles.id'), primary_key=True)
+    match_profile_id_fk = db.Column(db.Integer, db.ForeignKey('profiles.id'), primary_key=True, index=True)
+    matched_fields = db.Column(db.Integer, nullable=False)
+
 class Favourite(db.Model):
     __tablename__ = 'favorites'
     
@@ -0,0 +1,117 @@
+import base64
+import json
+from datetime import datetime
+from flask import current_app, request
+from app import db
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row on a page as an opaque token"""
+    raw = json.dumps(values, separators=(',', ':'), default=_json_default).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor, or raise InvalidCursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+def _coerce(value, python_type):
+    """Convert a decoded cursor value back to the sort key's Python type"""
+    if python_type is datetime and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError as e:
+            raise InvalidCursor('Invalid cursor') from e
+    if python_type is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, python_type):
+        raise InvalidCursor('Invalid cursor')
+    return value
+
+
+def page_args(default_limit, key_types):
+    """Read `limit` and `cursor` from the query string.
+
+    The limit is clamped to MAX_PAGE_SIZE; `key_types` gives the Python type
+    of each value in the cursor's sort key.
+    """
+    limit = request.args.get('limit', default=default_limit, type=int)
+    limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    token = request.args.get('cursor')
+    if not token:
+        return limit, None
+    cursor = decode_cursor(token)
+    if not isinstance(cursor, list) or len(cursor) != len(key_types):
+        raise InvalidCursor('Invalid cursor')
+    return limit, [_coerce(v, t) for v, t in zip(cursor, key_types)]
+
+
+def _after_cursor(keys, cursor):
+    """Filter selecting rows that sort after `cursor` under `keys`"""
+    if len({descending for _, descending in keys}) == 1:
+        # Uniform direction: a row-value comparison can use a composite index
+        columns = db.tuple_(*[column for column, _ in keys])
+        values = db.tuple_(*[db.literal(v, column.type) for (column, _), v in zip(keys, cursor)])
+        return columns < values if keys[0][1] else columns > values
+
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        equal = [keys[j][0] == cursor[j] for j in range(i)]
+        clauses.append(db.and_(*equal, column < cursor[i] if descending else column > cursor[i]))
+    return db.or_(*clauses)
+
+
+def sort_clauses(keys):
+    return [column.desc() if descending else column.asc() for column, descending in keys]
+
+
+def paginate(query, keys, default_limit=None):
+    """Fetch one page of `query` ordered by `keys`, a list of
+    (column, descending) pairs whose combined values are unique per row.
+
+    Returns the page's rows and the sort key to resume from, or None on the
+    last page. Raises InvalidCursor for a malformed cursor.
+    """
+    if default_limit is None:
+        default_limit = current_app.config['PAGE_SIZE']
+    key_types = [column.type.python_type for column, _ in keys]
+    limit, cursor = page_args(default_limit, key_types)
+
+    if cursor is not None:
+        query = query.filter(_after_cursor(keys, cursor))
+    query = query.order_by(*sort_clauses(keys))
+    query = query.add_columns(*[column.label(f'_page_key_{i}') for i, (column, _) in enumerate(keys)])
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = list(rows[-1][-len(keys):])
+
+    width = len(rows[0]) - len(keys) if rows else 0
+    items = [row[0] if width == 1 else row[:width] for row in rows]
+    return items, next_cursor
+
+
+def with_next_cursor(response, next_cursor):
+    """Attach the next page token to a response, if there is a next page"""
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(next_cursor)
+    return response
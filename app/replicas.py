@@ -0,0 +1,121 @@
+import itertools
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+# Methods whose handlers only read and so may be served from a replica
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_round_robin = itertools.count()
+# Identity -> when its read-your-writes window ends, for this worker. Expired
+# entries are dropped on lookup and swept once per window on insert
+_recent_writers = {}
+_recent_writers_lock = threading.Lock()
+_next_sweep = 0.0
+
+
+def replica_binds(app):
+    """SQLALCHEMY_BINDS entries for the configured read replicas"""
+    return {f'{REPLICA_BIND_PREFIX}{i}': uri for i, uri in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or [])}
+
+
+def _identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:  # the endpoint doesn't verify a token
+        return None
+
+
+def mark_recent_writer(identity):
+    """Send this user's reads to the primary for READ_YOUR_WRITES_WINDOW seconds"""
+    global _next_sweep
+    window = current_app.config['READ_YOUR_WRITES_WINDOW']
+    now = time.monotonic()
+    with _recent_writers_lock:
+        if now >= _next_sweep:
+            for key in [key for key, expires in _recent_writers.items() if expires <= now]:
+                del _recent_writers[key]
+            _next_sweep = now + window
+        _recent_writers[str(identity)] = now + window
+    # Shared so the user's next request sees it whichever worker serves it
+    from app import cache
+    cache.backend.set(f'recent-writer:{identity}', True, window)
+
+
+def _is_recent_writer(identity):
+    now = time.monotonic()
+    with _recent_writers_lock:
+        expires = _recent_writers.get(str(identity))
+        if expires is not None and expires <= now:
+            del _recent_writers[str(identity)]
+    if expires is not None and expires > now:
+        return True
+    from app import cache
+    return cache.backend.get(f'recent-writer:{identity}') is not None
+
+
+def _choose_replica():
+    """The replica engine this request reads from, or None for the primary.
+
+    Decided on the request's first query and kept for the rest of it, so a
+    request never mixes snapshots from different replicas.
+    """
+    if 'db_replica' in g:
+        return g.db_replica
+    engine = None
+    if request.method in READ_METHODS:
+        engines = current_app.extensions['sqlalchemy'].engines
+        replicas = sorted(key for key in engines if isinstance(key, str) and key.startswith(REPLICA_BIND_PREFIX))
+        identity = _identity()
+        if replicas and (identity is None or not _is_recent_writer(identity)):
+            engine = engines[replicas[next(_round_robin) % len(replicas)]]
+    g.db_replica = engine
+    return engine
+
+
+class RoutingSession(Session):
+    """Session sending reads in safe requests to a read replica.
+
+    Flushes and bulk updates/deletes go to the primary and pin the session
+    there for the rest of the request, so it reads its own uncommitted
+    writes. Every request from a user who committed a write within
+    READ_YOUR_WRITES_WINDOW seconds also reads from the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if self._flushing or (clause is not None and clause.is_dml):
+            self.info['wrote'] = True
+        elif bind is None and not self.info.get('wrote') and has_request_context():
+            table = mapper.persist_selectable if mapper is not None else None
+            if table is None or table.info.get('bind_key') is None:
+                replica = _choose_replica()
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _remember_writer(sender, tables):
+    if has_request_context():
+        identity = _identity()
+        if identity is not None:
+            mark_recent_writer(identity)
+
+
+def init_app(app):
+    """Register the replica binds; call before db.init_app"""
+    binds = replica_binds(app)
+    if binds:
+        app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {}, **binds)
+        if app.config.get('CACHE_BACKEND') != 'sqlite':
+            app.logger.warning(
+                'Read replicas are configured with CACHE_BACKEND=%r: recent writes are only '
+                'tracked per worker, so a user whose next request reaches another worker may '
+                'read a replica that has not caught up. Use the sqlite cache backend.',
+                app.config.get('CACHE_BACKEND'),
+            )
+        from app.events import tables_committed
+        tables_committed.connect(_remember_writer)
@@ -1,15 +1,15 @@
-import os
-import uuid
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
-from werkzeug.utils import secure_filename
-from app import db, jwt
+from flask import Blueprint, request, jsonify, current_app
+from app import db, jwt, cache
 from app.models import User, Profile, Favourite
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.utils import profile_required
+from app.utils import profile_required, query_budget
+from app import serializers
+from app.matching import ranked_matches, refresh_profile_matches
+from app.pagination import InvalidCursor, page_args, paginate, with_next_cursor
+from app.uploads import InvalidPhoto, PhotoTooLarge, save_photo, serve_photo
 
 bp = Blueprint('profiles', __name__, url_prefix='/api/profiles')
 
-UPLOAD_FOLDER = 'uploads/profile_photos'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 def allowed_file(filename):
@@ -17,20 +17,21 @@ def allowed_file(filename):
 
 @bp.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(os.path.join(current_app.root_path, UPLOAD_FOLDER), filename)
+    return serve_photo(filename)
 
 @bp.route('/', methods=['GET'], strict_slashes=False)
 @jwt_required()
 @profile_required
+@cache.cached('profiles', 'users', timeout=30)
+@query_budget(1)
 def get_profiles():
-    limit = request.args.get('limit', default=4, type=int)
-    profiles = Profile.query.order_by(Profile.created_at.desc()).limit(limit).all()
-    profiles_data = []
-    for profile in profiles:
-        profile_dict = profile.to_dict()
-        profile_dict['name'] = profile.user.name  # Add user's name for frontend
-        profiles_data.append(profile_dict)
-    return jsonify(profiles_data), 200
+    keys = [(Profile.created_at, True), (Profile.id, True)]
+    query = serializers.profile_with_name.select(Profile.query)
+    try:
+        rows, next_cursor = paginate(query, keys, default_limit=4)
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    return with_next_cursor(jsonify(serializers.profile_with_name.from_rows(rows)), next_cursor), 200
 
 @bp.route('/', methods=['POST'], strict_slashes=False)
 @jwt_required()
@@ -56,12 +57,12 @@ def create_profile():
     
     photo_path = None
     if file and allowed_file(file.filename):
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = f'{uuid.uuid4().hex}.{ext}'
-        os.makedirs(os.path.join(current_app.root_path, UPLOAD_FOLDER), exist_ok=True)
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(os.path.join(current_app.root_path, file_path))
-        photo_path = f'/api/profiles/uploads/{filename}'
+        try:
+            photo_path = save_photo(file)
+        except PhotoTooLarge as e:
+            return jsonify({'message': str(e)}), 413
+        except InvalidPhoto as e:
+            return jsonify({'message': str(e)}), 400
     
     profile = Profile(
         user_id_fk=current_user_id,
@@ -82,6 +83,7 @@ def create_profile():
     )
     profile.check_completeness()
     db.session.add(profile)
+    refresh_profile_matches(profile)
     db.session.commit()
     p = profile.to_dict()
     p['name'] = profile.user.name  # Add user's name for frontend
@@ -89,8 +91,8 @@ def create_profile():
 
 @bp.route('/<int:profile_id>', methods=['GET'], strict_slashes=False)
 def get_profile(profile_id):
-    profile = Profile.query.get_or_404(profile_id)
-    return jsonify(profile.to_dict()), 200
+    profile = serializers.profile.load(Profile.query).get_or_404(profile_id)
+    return jsonify(serializers.profile(profile)), 200
 
 @bp.route('/<int:user_id>/favourite', methods=['POST'], strict_slashes=False)
 @jwt_required()
@@ -98,7 +100,7 @@ def get_profile(profile_id):
 def add_favorite(user_id):
     current_user_id = get_jwt_identity()
     
-    if current_user_id == user_id:
+    if str(current_user_id) == str(user_id):
         return jsonify({'message': 'Cannot favorite yourself'}), 400
     
     if Favourite.query.filter_by(user_id_fk=current_user_id, fav_user_id_fk=user_id).first():
@@ -110,6 +112,8 @@ def add_favorite(user_id):
     )
     
     db.session.add(favourite)
+    User.query.filter_by(id=user_id)\
+        .update({User.favorite_count: User.favorite_count + 1}, synchronize_session=False)
     db.session.commit()
     
     return jsonify({'message': 'User added to favorites'}), 201
@@ -117,50 +121,35 @@ def add_favorite(user_id):
 @bp.route('/matches/<int:profile_id>', methods=['GET'], strict_slashes=False)
 @jwt_required()
 @profile_required
+@query_budget(3)
 def get_matches(profile_id):
     current_user_id = get_jwt_identity()
     profile = Profile.query.get_or_404(profile_id)
     
-    if profile.user_id_fk != current_user_id:
+    if str(profile.user_id_fk) != str(current_user_id):
         return jsonify({'message': 'Not authorized to view matches for this profile'}), 403
     
-    all_profiles = Profile.query.filter(Profile.user_id_fk != current_user_id).all()
+    try:
+        limit, cursor = page_args(current_app.config['MATCHES_PAGE_SIZE'], (int, int))
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
     
+    page, next_cursor = ranked_matches(profile, current_user_id, limit, cursor, load=serializers.profile.load)
+    serialize = serializers.profile.for_request()
     matches = []
-    for p in all_profiles:
-        age_diff = abs(profile.birth_year - p.birth_year)
-        if age_diff > 5:
-            continue
-        
-        height_diff = abs(profile.height - p.height)
-        if height_diff < 3 or height_diff > 10:
-            continue
-        
-        matched_fields = 0
-        if profile.fav_cuisine == p.fav_cuisine:
-            matched_fields += 1
-        if profile.fav_colour == p.fav_colour:
-            matched_fields += 1
-        if profile.fav_school_subject == p.fav_school_subject:
-            matched_fields += 1
-        if profile.political == p.political:
-            matched_fields += 1
-        if profile.religious == p.religious:
-            matched_fields += 1
-        if profile.family_oriented == p.family_oriented:
-            matched_fields += 1
-            
-        if matched_fields >= 3:
-            matches.append(p.to_dict())
+    for p, score in page:
+        match_dict = serialize(p)
+        match_dict['score'] = score
+        matches.append(match_dict)
     
-    return jsonify(matches), 200
+    return with_next_cursor(jsonify(matches), next_cursor), 200
 
 @bp.route('/<int:profile_id>', methods=['PUT'], strict_slashes=False)
 @jwt_required()
 def update_profile(profile_id):
     profile = Profile.query.get_or_404(profile_id)
     current_user_id = get_jwt_identity()
-    if profile.user_id_fk != current_user_id:
+    if str(profile.user_id_fk) != str(current_user_id):
         return jsonify({'message': 'Not authorized to edit this profile'}), 403
 
     if request.content_type and request.content_type.startswith('multipart/form-data'):
@@ -188,14 +177,15 @@ def update_profile(profile_id):
 
     # Handle photo update
     if file and allowed_file(file.filename):
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = f'{uuid.uuid4().hex}.{ext}'
-        os.makedirs(os.path.join(current_app.root_path, UPLOAD_FOLDER), exist_ok=True)
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(os.path.join(current_app.root_path, file_path))
-        profile.photo = f'/api/profiles/uploads/{filename}'
+        try:
+            profile.photo = save_photo(file)
+        except PhotoTooLarge as e:
+            return jsonify({'message': str(e)}), 413
+        except InvalidPhoto as e:
+            return jsonify({'message': str(e)}), 400
 
     profile.check_completeness()
+    refresh_profile_matches(profile)
     db.session.commit()
     p = profile.to_dict()
     p['name'] = profile.user.name
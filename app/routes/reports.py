@@ -2,7 +2,10 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models import Report, User
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.utils import profile_required
+from app.utils import profile_required, query_budget
+from app import serializers
+from app.pagination import InvalidCursor, paginate, sort_clauses, with_next_cursor
+from app.streaming import stream_query, wants_stream
 
 bp = Blueprint('reports', __name__, url_prefix='/api/reports')
 
@@ -38,6 +41,7 @@ def create_report():
 @bp.route('/', methods=['GET'], strict_slashes=False)
 @jwt_required()
 @profile_required
+@query_budget(1)
 def get_reports():
     # Get query parameters for sorting
     sort_by = request.args.get('sort_by', 'created_at')  # Default sort by created_at
@@ -49,19 +53,27 @@ def get_reports():
         return jsonify({'message': f'Invalid sort_by field. Must be one of: {", ".join(valid_sort_fields)}'}), 400
     
     # Build the query
-    query = Report.query
+    query = serializers.report.load(Report.query)
+    descending = order == 'desc'
     
-    # Apply sorting
+    # Apply sorting, with the report id breaking ties
     if sort_by == 'created_at':
-        query = query.order_by(Report.created_at.desc() if order == 'desc' else Report.created_at.asc())
+        keys = [(Report.created_at, descending)]
     elif sort_by == 'reporter_name':
-        query = query.join(User, Report.reporter_id_fk == User.id)\
-            .order_by(User.name.desc() if order == 'desc' else User.name.asc())
+        query = query.join(User, Report.reporter_id_fk == User.id)
+        keys = [(User.name, descending)]
     elif sort_by == 'reported_user_name':
-        query = query.join(User, Report.reported_user_id_fk == User.id)\
-            .order_by(User.name.desc() if order == 'desc' else User.name.asc())
+        query = query.join(User, Report.reported_user_id_fk == User.id)
+        keys = [(User.name, descending)]
     elif sort_by == 'reason':
-        query = query.order_by(Report.reason.desc() if order == 'desc' else Report.reason.asc())
+        keys = [(Report.reason, descending)]
+    keys.append((Report.id, descending))
     
-    reports = query.all()
-    return jsonify([report.to_dict() for report in reports]), 200 
\ No newline at end of file
+    if wants_stream():
+        return stream_query(query.order_by(*sort_clauses(keys)), serializers.report)
+    
+    try:
+        reports, next_cursor = paginate(query, keys)
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    return with_next_cursor(jsonify(serializers.report.many(reports)), next_cursor), 200 
\ No newline at end of file
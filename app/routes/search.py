@@ -1,32 +1,99 @@
 from flask import Blueprint, request, jsonify
-from app import db
-from app.models import Profile, User
+from app import db, serializers
+from app.models import Profile
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.utils import profile_required
+from app.utils import profile_required, query_budget
+from app.fulltext import apply_fulltext
+from app.pagination import InvalidCursor, paginate, with_next_cursor
+from app.search_cache import cached_search, normalize_filters
 
 bp = Blueprint('search', __name__, url_prefix='/api/search')
 
+# Facets counted by /api/search/facets; birth years are grouped by decade
+FACET_FIELDS = ('sex', 'race', 'parish')
+BIRTH_YEAR_BUCKET = 10
+
+def _apply_filters(query, filters):
+    """Apply normalized search filters to a query over profiles.
+
+    Returns the filtered query and the full-text rank columns it gained.
+    """
+    # Free text and name searches go through the full-text index, most relevant first
+    ranks = []
+    if filters['q']:
+        query, rank = apply_fulltext(query, filters['q'])
+        ranks.append(rank)
+    if filters['name']:
+        query, rank = apply_fulltext(query, filters['name'], column='name')
+        ranks.append(rank)
+    if filters['birth_year']:
+        query = query.filter(Profile.birth_year == filters['birth_year'])
+    if filters['sex']:
+        query = query.filter(Profile.sex == filters['sex'])
+    if filters['race']:
+        query = query.filter(Profile.race == filters['race'])
+    return query, ranks
+
 @bp.route('/', methods=['GET'], strict_slashes=False)
 @jwt_required()
 @profile_required
+@query_budget(2)
 def search_profiles():
     current_user_id = get_jwt_identity()
-    query = Profile.query.filter(Profile.user_id_fk != current_user_id)
+    filters = normalize_filters(request.args)
+    
+    def run_search():
+        # Results are shared between users, so the caller's own profiles
+        # are dropped after the lookup rather than in the query
+        query, ranks = _apply_filters(db.session.query(Profile.id, Profile.user_id_fk), filters)
+        if ranks:
+            keys = [(sum(ranks[1:], ranks[0]), True), (Profile.id, False)]
+        else:
+            keys = [(Profile.created_at, False), (Profile.id, False)]
+        return paginate(query, keys)
+    
+    try:
+        rows, next_cursor = cached_search(
+            filters, request.args.get('cursor'), request.args.get('limit'), run_search
+        )
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    
+    ids = [profile_id for profile_id, user_id in rows if str(user_id) != str(current_user_id)]
+    query = serializers.profile.select(Profile.query.filter(Profile.id.in_(ids)))
+    profiles = {profile['id']: profile for profile in serializers.profile.from_rows(query)} if ids else {}
+    return with_next_cursor(jsonify([profiles[i] for i in ids if i in profiles]), next_cursor), 200
+
+@bp.route('/facets', methods=['GET'])
+@jwt_required()
+@profile_required
+@query_budget(1)
+def search_facets():
+    """Counts per sex, race, parish and birth decade for the current filters"""
+    current_user_id = get_jwt_identity()
+    filters = normalize_filters(request.args)
     
-    name = request.args.get('name')
-    birth_year = request.args.get('birth_year')
-    sex = request.args.get('sex')
-    race = request.args.get('race')
+    # One grouped pass over every facet at once; the groups are few enough
+    # (distinct sex x race x parish x decade) to roll up per facet here
+    decade = (Profile.birth_year // BIRTH_YEAR_BUCKET * BIRTH_YEAR_BUCKET).label('birth_decade')
+    columns = [getattr(Profile, field) for field in FACET_FIELDS] + [decade]
+    query = db.session.query(*columns, db.func.count(Profile.id)) \
+        .filter(Profile.user_id_fk != current_user_id)
+    query, _ = _apply_filters(query, filters)
+    rows = query.group_by(*columns).all()
     
-    if name:
-        query = query.join(User).filter(User.name.ilike(f'%{name}%'))
-    if birth_year:
-        query = query.filter(Profile.birth_year == birth_year)
-    if sex:
-        query = query.filter(Profile.sex == sex)
-    if race:
-        query = query.filter(Profile.race == race)
+    facets = {field: {} for field in FACET_FIELDS + ('birth_decade',)}
+    total = 0
+    for *values, count in rows:
+        total += count
+        for field, value in zip(facets, values):
+            facets[field][value] = facets[field].get(value, 0) + count
     
-    profiles = query.all()
-    print(profiles)
-    return jsonify([profile.to_dict() for profile in profiles]), 200
\ No newline at end of file
+    return jsonify({
+        'total': total,
+        'facets': {
+            field: [{'value': value, 'count': count}
+                    for value, count in sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))]
+            for field, counts in facets.items()
+        }
+    }), 200
@@ -1,57 +1,80 @@
 from flask import Blueprint, request, jsonify
-from app import db
+from app import db, cache
 from app.models import User, Profile, Favourite
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.utils import profile_required
+from app.utils import profile_required, query_budget, forget_profile_completeness
+from app import serializers
+from app.matching import delete_user_matches
+from app.pagination import InvalidCursor, paginate, sort_clauses, with_next_cursor
+from app.streaming import stream_query, wants_stream
 
 bp = Blueprint('users', __name__, url_prefix='/api/users')
 
 @bp.route('/', methods=['GET'], strict_slashes=False)
 @jwt_required()
 @profile_required
+@query_budget(1)
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users]), 200
+    keys = [(User.date_joined, False), (User.id, False)]
+    query = serializers.user.select(User.query)
+    if wants_stream():
+        return stream_query(query.order_by(*sort_clauses(keys)), serializers.user.for_rows())
+    try:
+        rows, next_cursor = paginate(query, keys)
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    return with_next_cursor(jsonify(serializers.user.from_rows(rows)), next_cursor), 200
 
 @bp.route('/<int:user_id>', methods=['GET'], strict_slashes=False)
 @jwt_required()
 @profile_required
+@query_budget(1)
 def get_user(user_id):
-    user = User.query.get_or_404(user_id)
-    return jsonify(user.to_dict()), 200
+    user = serializers.user.load(User.query).get_or_404(user_id)
+    return jsonify(serializers.user(user)), 200
 
 @bp.route('/favorites', methods=['GET'], strict_slashes=False)
 @jwt_required()
 @profile_required
+@query_budget(1)
 def get_favorites():
     current_user_id = get_jwt_identity()
-    favorites = Favourite.query.filter_by(user_id_fk=current_user_id).all()
-    favorite_users = [fav.favorite_user.to_dict() for fav in favorites]
-    return jsonify(favorite_users), 200
+    query = serializers.favourite_user.select(Favourite.query.filter_by(user_id_fk=current_user_id))
+    try:
+        rows, next_cursor = paginate(query, [(Favourite.created_at, False), (Favourite.id, False)])
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    favorite_users = serializers.favourite_user.from_rows(rows)
+    return with_next_cursor(jsonify(favorite_users), next_cursor), 200
 
 @bp.route('/<int:user_id>/favourites', methods=['GET'], strict_slashes=False)
 @jwt_required()
 @profile_required
+@query_budget(1)
 def get_user_favourites(user_id):
     sort_by = request.args.get('sort_by', 'name')
     order = request.args.get('order', 'asc')
     valid_sort_fields = ['name', 'parish', 'birth_year']
     if sort_by not in valid_sort_fields:
         return jsonify({'message': f'Invalid sort_by field. Must be one of: {", ".join(valid_sort_fields)}'}), 400
-    favorites = Favourite.query.filter_by(user_id_fk=user_id).all()
-    favorite_users = [fav.favorite_user.to_dict() for fav in favorites]
-    reverse = (order == 'desc')
+    query = serializers.favourite_user.select(Favourite.query.filter_by(user_id_fk=user_id))
+    # Users carry no parish or birth year, so those sorts keep favourite order
+    keys = [(Favourite.id, False)]
     if sort_by == 'name':
-        favorite_users.sort(key=lambda u: (u.get('name') or '').lower(), reverse=reverse)
-    elif sort_by == 'parish':
-        favorite_users.sort(key=lambda u: (u.get('parish') or '').lower(), reverse=reverse)
-    elif sort_by == 'birth_year':
-        favorite_users.sort(key=lambda u: u.get('birth_year', 0), reverse=reverse)
-    return jsonify(favorite_users), 200
+        query = query.join(User, Favourite.fav_user_id_fk == User.id)
+        keys.insert(0, (db.func.lower(User.name, type_=db.String), order == 'desc'))
+    try:
+        rows, next_cursor = paginate(query, keys)
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    favorite_users = serializers.favourite_user.from_rows(rows)
+    return with_next_cursor(jsonify(favorite_users), next_cursor), 200
 
 @bp.route('/favourites/<int:n>', methods=['GET'], strict_slashes=False)
 @jwt_required()
 @profile_required
+@cache.cached('users')
+@query_budget(1)
 def get_top_n_favourited(n):
     sort_by = request.args.get('sort_by', 'name')
     order = request.args.get('order', 'asc')
@@ -60,42 +83,46 @@ def get_top_n_favourited(n):
         return jsonify({'message': f'Invalid sort_by field. Must be one of: {", ".join(valid_sort_fields)}'}), 400
     if n <= 0:
         return jsonify({'message': 'N must be a positive integer'}), 400
-    most_favorited = db.session.query(User, db.func.count(Favourite.id).label('favorite_count'))\
-        .join(Favourite, User.id == Favourite.fav_user_id_fk)\
-        .group_by(User.id)\
+    # The first N favourited users in sort order, ties in id order. Users carry
+    # no parish or birth year, so those sorts are by id alone
+    keys = [User.id]
+    descending = (order == 'desc')
+    if sort_by == 'name':
+        name = db.func.lower(User.name)
+        keys.insert(0, name.desc() if descending else name)
+    elif sort_by == 'favorite_count':
+        keys.insert(0, User.favorite_count.desc() if descending else User.favorite_count)
+    most_favorited = serializers.user.load(User.query, User.name, User.favorite_count)\
+        .filter(User.favorite_count > 0)\
+        .order_by(*keys)\
+        .limit(n)\
         .all()
+    serialize = serializers.user.for_request()
     result = []
-    for user, count in most_favorited:
-        user_dict = user.to_dict()
-        user_dict['favorite_count'] = count
+    for user in most_favorited:
+        user_dict = serialize(user)
+        user_dict['favorite_count'] = user.favorite_count
         result.append(user_dict)
-    reverse = (order == 'desc')
-    if sort_by == 'name':
-        result.sort(key=lambda u: (u.get('name') or '').lower(), reverse=reverse)
-    elif sort_by == 'parish':
-        result.sort(key=lambda u: (u.get('parish') or '').lower(), reverse=reverse)
-    elif sort_by == 'birth_year':
-        result.sort(key=lambda u: u.get('birth_year', 0), reverse=reverse)
-    elif sort_by == 'favorite_count':
-        result.sort(key=lambda u: u.get('favorite_count', 0), reverse=reverse)
-    return jsonify(result[:n]), 200
+    return jsonify(result), 200
 
 @bp.route('/most-favorited', methods=['GET'], strict_slashes=False)
 @jwt_required()
 @profile_required
+@cache.cached('users')
+@query_budget(1)
 def get_most_favorited():
     # Get the top 20 most favorited users
-    most_favorited = db.session.query(User, db.func.count(Favourite.id).label('favorite_count'))\
-        .join(Favourite, User.id == Favourite.fav_user_id_fk)\
-        .group_by(User.id)\
-        .order_by(db.desc('favorite_count'))\
+    most_favorited = serializers.user.load(User.query, User.favorite_count)\
+        .filter(User.favorite_count > 0)\
+        .order_by(User.favorite_count.desc(), User.id)\
         .limit(20)\
         .all()
     
+    serialize = serializers.user.for_request()
     result = []
-    for user, count in most_favorited:
-        user_dict = user.to_dict()
-        user_dict['favorite_count'] = count
+    for user in most_favorited:
+        user_dict = serialize(user)
+        user_dict['favorite_count'] = user.favorite_count
         result.append(user_dict)
     
     return jsonify(result), 200
@@ -107,10 +134,17 @@ def delete_user(user_id):
     if int(current_user_id) != int(user_id):
         return jsonify({'message': 'You can only delete your own account.'}), 403
     user = User.query.get_or_404(user_id)
+    # Users this user favourited lose one favourite each
+    favourited_ids = db.session.query(Favourite.fav_user_id_fk).filter(Favourite.user_id_fk == user_id)
+    User.query.filter(User.id.in_(favourited_ids))\
+        .update({User.favorite_count: User.favorite_count - 1}, synchronize_session=False)
     # Delete all related favourites (as user and as favourite)
     Favourite.query.filter((Favourite.user_id_fk == user_id) | (Favourite.fav_user_id_fk == user_id)).delete(synchronize_session=False)
+    # Delete stored matches involving the user's profiles
+    delete_user_matches(user_id)
     # Delete all related profiles
     Profile.query.filter_by(user_id_fk=user_id).delete(synchronize_session=False)
     db.session.delete(user)
     db.session.commit()
+    forget_profile_completeness(user_id)
     return jsonify({'message': 'User and all related data deleted successfully.'}), 200
\ No newline at end of file
@@ -0,0 +1,115 @@
+from array import array
+from itertools import combinations
+from flask import current_app
+from sqlalchemy import event, inspect
+from app import db, cache
+from app.models import Profile, User
+
+# Structured search filters; every cache entry depends on exactly one
+# namespace naming the combination of these filters it was built with
+FILTER_FIELDS = ('birth_year', 'sex', 'race')
+
+# Bumped when profiles change in ways that can't be attributed to values,
+# such as bulk deletes, and when user names change (name and q searches)
+EPOCH_NAMESPACE = 'search:epoch'
+NAMES_NAMESPACE = 'search:names'
+
+
+def _normalize_text(value):
+    return ' '.join((value or '').lower().split())
+
+
+def normalize_filters(args):
+    """Canonical form of the search filters in a request's query string"""
+    filters = {
+        'q': _normalize_text(args.get('q')),
+        'name': _normalize_text(args.get('name')),
+    }
+    for field in FILTER_FIELDS:
+        filters[field] = (args.get(field) or '').strip()
+    return filters
+
+
+def _namespace(values):
+    parts = [f'{field}={values[field]}' for field in FILTER_FIELDS if field in values]
+    return 'search:' + '&'.join(parts)
+
+
+def filter_namespaces(filters):
+    """Namespaces a search with these filters depends on"""
+    namespaces = [_namespace({f: filters[f] for f in FILTER_FIELDS if filters[f]}), EPOCH_NAMESPACE]
+    if filters['q'] or filters['name']:
+        namespaces.append(NAMES_NAMESPACE)
+    return namespaces
+
+
+def _profile_namespaces(values):
+    """Every filter combination a profile with `values` can appear under"""
+    fields = [field for field in FILTER_FIELDS if field in values]
+    return {
+        _namespace({field: values[field] for field in subset})
+        for size in range(len(fields) + 1)
+        for subset in combinations(fields, size)
+    }
+
+
+def _values(state, history_side):
+    values = {}
+    for field in FILTER_FIELDS:
+        history = state.attrs[field].history
+        current = getattr(history, history_side) or history.unchanged
+        if current:
+            values[field] = str(current[0]).strip()
+    return values
+
+
+def cached_search(filters, cursor_token, limit, compute):
+    """Return a page of (profile id, owner id) pairs for the filters.
+
+    `compute` runs the query on a miss and returns (pairs, next_cursor);
+    pairs are stored as two compact arrays. The caller's own profiles are
+    not filtered here, so entries are shared between users.
+    """
+    def build():
+        pairs, next_cursor = compute()
+        ids = array('q', (pid for pid, _ in pairs))
+        owners = array('q', (uid for _, uid in pairs))
+        return ids, owners, next_cursor
+
+    parts = ('search', tuple(sorted(filters.items())), cursor_token, limit)
+    timeout = current_app.config['SEARCH_CACHE_TIMEOUT']
+    (ids, owners, next_cursor), _ = cache.memoize(parts, filter_namespaces(filters), build, timeout)
+    return list(zip(ids, owners)), next_cursor
+
+
+@event.listens_for(db.session, 'before_flush')
+def _track_search_writes(session, flush_context, instances):
+    namespaces = session.info.setdefault('search_namespaces', set())
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Profile):
+            state = inspect(obj)
+            # A profile moving from one combination to another affects both
+            namespaces |= _profile_namespaces(_values(state, 'deleted'))
+            namespaces |= _profile_namespaces(_values(state, 'added'))
+        elif isinstance(obj, User) and inspect(obj).attrs.name.history.has_changes():
+            namespaces.add(NAMES_NAMESPACE)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk_search_writes(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is Profile:
+        orm_execute_state.session.info.setdefault('search_namespaces', set()).add(EPOCH_NAMESPACE)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_searches(session):
+    namespaces = session.info.pop('search_namespaces', None)
+    if namespaces:
+        cache.backend.bump_versions(sorted(namespaces))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _reset_on_rollback(session):
+    session.info.pop('search_namespaces', None)
@@ -0,0 +1,270 @@
+import time
+from itertools import islice
+import numpy as np
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from app import db
+from app.fulltext import rebuild_fulltext_index
+from app.matching import rebuild_profile_matches
+from app.models import Favourite, Profile, ProfileMatch, Report, User
+
+SEED = 3180
+PASSWORD = 'password'
+BATCH_SIZE = 50_000
+# Users whose favourites are generated together; bounds memory for large runs
+CHUNK_USERS = 100_000
+# Distinct descriptions, biographies and report reasons to pick from
+TEXT_POOL = 4096
+# Spread of join dates, ending at EPOCH
+JOIN_SPAN = 3 * 365 * 24 * 3600
+EPOCH = np.datetime64('2025-01-01T00:00:00', 's')
+
+FIRST_NAMES = ('Aaliyah', 'Andre', 'Brianna', 'Damion', 'Kemar', 'Keisha', 'Marlon', 'Nadine', 'Omar', 'Shanice',
+               'Tashana', 'Rohan', 'Jamila', 'Dwayne', 'Kimberley', 'Romaine', 'Tanisha', 'Jermaine')
+LAST_NAMES = ('Brown', 'Campbell', 'Clarke', 'Francis', 'Gordon', 'Grant', 'McLymont', 'Morgan', 'Reid',
+              'Richards', 'Thompson', 'Walker', 'Williams', 'Wright')
+PARISHES = ('Kingston', 'St. Andrew', 'St. Thomas', 'Portland', 'St. Mary', 'St. Ann', 'Trelawny',
+            'St. James', 'Hanover', 'Westmoreland', 'St. Elizabeth', 'Manchester', 'Clarendon', 'St. Catherine')
+SEXES = ('Male', 'Female')
+RACES = ('Black', 'White', 'Asian', 'Indian', 'Mixed', 'Other')
+CUISINES = ('Jamaican', 'Chinese', 'Indian', 'Italian', 'Mexican', 'Japanese', 'Thai', 'American')
+COLOURS = ('Red', 'Blue', 'Green', 'Yellow', 'Black', 'White', 'Purple', 'Orange')
+SUBJECTS = ('Mathematics', 'English', 'Biology', 'Chemistry', 'Physics', 'History', 'Geography', 'Art')
+WORDS = ('music', 'beach', 'reading', 'football', 'cooking', 'travel', 'church', 'dancing', 'hiking', 'movies',
+         'family', 'friends', 'coding', 'art', 'cricket', 'reggae', 'nature', 'gaming', 'fitness', 'food')
+
+SEEDED_TABLES = (User.__table__, Profile.__table__, Favourite.__table__, Report.__table__)
+
+
+class DatabaseNotEmpty(RuntimeError):
+    pass
+
+
+def _timestamps(offsets):
+    """Datetime strings for seconds since the start of the join window.
+
+    Written with microseconds, as SQLAlchemy stores DateTime in SQLite, so
+    they compare correctly with bound datetimes (e.g. in keyset cursors).
+    """
+    if not len(offsets):
+        return []  # np.char can't handle the empty array's '<U1' dtype
+    values = (EPOCH - JOIN_SPAN + offsets.astype('timedelta64[s]')).astype('datetime64[us]').astype(str)
+    return np.char.replace(values, 'T', ' ').tolist()
+
+
+def _texts(rng, count, words):
+    picks = rng.integers(len(WORDS), size=(count, words))
+    return [' '.join(WORDS[w] for w in row).capitalize() for row in picks]
+
+
+def _pick(rng, choices, count):
+    return [choices[i] for i in rng.integers(len(choices), size=count)]
+
+
+def _insert(conn, table, columns, rows):
+    """executemany straight to the driver, BATCH_SIZE rows at a time.
+
+    Rows are tuples of values the driver accepts as they are, which skips
+    SQLAlchemy's per-row parameter processing.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    placeholder = '?' if conn.dialect.paramstyle == 'qmark' else '%s'
+    statement = f"INSERT INTO {quote(table.name)} ({', '.join(quote(c) for c in columns)}) " \
+                f"VALUES ({', '.join([placeholder] * len(columns))})"
+    rows = iter(rows)
+    while batch := list(islice(rows, BATCH_SIZE)):
+        conn.exec_driver_sql(statement, batch)
+
+
+class Popularity:
+    """Draws user ids with a power-law (Zipf) distribution.
+
+    The user at popularity rank r is drawn with weight 1 / r**alpha; ranks
+    are shuffled so popular users are spread across the id range.
+    """
+
+    def __init__(self, rng, users, alpha):
+        self.by_rank = rng.permutation(users) + 1
+        cdf = np.cumsum(1.0 / np.arange(1, users + 1) ** alpha)
+        self.cdf = cdf / cdf[-1]
+
+    def draw(self, rng, count):
+        return self.by_rank[np.minimum(np.searchsorted(self.cdf, rng.random(count)), len(self.cdf) - 1)]
+
+
+def _favourites(chunk_seeds, popularity, users, mean):
+    """Yield (user ids, favourite user ids, time offsets) arrays per chunk of users.
+
+    Each chunk draws from a generator made from its own seed, so the same
+    pairs can be produced twice: once to count favourites per user, once
+    to insert them.
+    """
+    for start, chunk_seed in zip(range(0, users, CHUNK_USERS), chunk_seeds):
+        rng = np.random.default_rng(chunk_seed)
+        ids = np.arange(start + 1, min(start + CHUNK_USERS, users) + 1, dtype=np.int64)
+        src = np.repeat(ids, np.minimum(rng.poisson(mean, len(ids)), users - 1))
+        dst = popularity.draw(rng, len(src))
+        # One favourite per pair (unique_favorite) and none of oneself
+        pairs = np.unique(src[src != dst] * (users + 1) + dst[src != dst])
+        src, dst = pairs // (users + 1), pairs % (users + 1)
+        yield src, dst, rng.integers(0, 30 * 24 * 3600, len(src))
+
+
+def _disable_indexes_and_triggers(conn):
+    """Drop secondary indexes and full-text triggers for the load; returns how to restore them"""
+    indexes = [index for table in SEEDED_TABLES for index in table.indexes]
+    for index in indexes:
+        index.drop(conn, checkfirst=True)
+    if conn.dialect.name == 'sqlite':
+        triggers = conn.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ('users', 'profiles')"
+        ).all()
+        for name, _ in triggers:
+            conn.exec_driver_sql(f'DROP TRIGGER {name}')
+    else:
+        triggers = []
+        for table in ('users', 'profiles'):
+            conn.exec_driver_sql(f'ALTER TABLE {table} DISABLE TRIGGER USER')
+
+    def restore(conn):
+        for index in indexes:
+            index.create(conn, checkfirst=True)
+        if conn.dialect.name == 'sqlite':
+            for _, sql in triggers:
+                conn.exec_driver_sql(sql)
+        else:
+            for table in ('users', 'profiles'):
+                conn.exec_driver_sql(f'ALTER TABLE {table} ENABLE TRIGGER USER')
+
+    return restore
+
+
+def _reset_sequences(conn):
+    if conn.dialect.name != 'postgresql':
+        return
+    for table in SEEDED_TABLES:
+        conn.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {table.name}"
+        )
+
+
+def clear_tables(conn):
+    """Delete every row the seeder writes, children first"""
+    for table in (ProfileMatch.__table__,) + SEEDED_TABLES[::-1]:
+        conn.execute(table.delete())
+
+
+def _load(conn, rng, chunk_seeds, users, favourites, reports, extra_profiles, alpha, password, progress):
+    """Generate and insert every table; returns {table name: rows}"""
+    popularity = Popularity(rng, users, alpha)
+    favorite_counts = np.zeros(users + 1, dtype=np.int64)
+    for _, dst, _ in _favourites(chunk_seeds, popularity, users, favourites):
+        favorite_counts += np.bincount(dst, minlength=users + 1)
+
+    counts = {}
+    joined = np.sort(rng.integers(0, JOIN_SPAN, users))
+    password_hash = generate_password_hash(password)
+    ids = range(1, users + 1)
+    names = [f'{first} {last}' for first, last in zip(_pick(rng, FIRST_NAMES, users), _pick(rng, LAST_NAMES, users))]
+    _insert(conn, User.__table__,
+            ('id', 'username', 'email', 'password_hash', 'name', 'date_joined', 'profile_complete', 'favorite_count'),
+            zip(ids, (f'user{i}' for i in ids), (f'user{i}@example.com' for i in ids),
+                [password_hash] * users, names, _timestamps(joined), [True] * users,
+                favorite_counts[1:].tolist()))
+    counts['users'] = users
+    progress(f'users: {users}')
+
+    owners = np.arange(1, users + 1)
+    if extra_profiles:
+        owners = np.concatenate([owners, np.sort(rng.choice(users, int(users * extra_profiles), replace=False) + 1)])
+    total = len(owners)
+    descriptions, biographies = _texts(rng, TEXT_POOL, 6), _texts(rng, TEXT_POOL, 20)
+    created = np.minimum(joined[owners - 1] + rng.integers(0, 7 * 24 * 3600, total), JOIN_SPAN)
+    _insert(conn, Profile.__table__,
+            ('id', 'user_id_fk', 'description', 'parish', 'biography', 'sex', 'race', 'birth_year', 'height',
+             'fav_cuisine', 'fav_colour', 'fav_school_subject', 'political', 'religious', 'family_oriented',
+             'created_at', 'is_complete'),
+            zip(range(1, total + 1), owners.tolist(),
+                _pick(rng, descriptions, total), _pick(rng, PARISHES, total), _pick(rng, biographies, total),
+                _pick(rng, SEXES, total), _pick(rng, RACES, total),
+                rng.integers(1960, 2006, total).tolist(), np.round(rng.uniform(150, 200, total), 1).tolist(),
+                _pick(rng, CUISINES, total), _pick(rng, COLOURS, total), _pick(rng, SUBJECTS, total),
+                *(rng.random((3, total)) < 0.5).tolist(),
+                _timestamps(created), [True] * total))
+    counts['profiles'] = total
+    progress(f'profiles: {total}')
+
+    counts['favorites'] = 0
+    for src, dst, offsets in _favourites(chunk_seeds, popularity, users, favourites):
+        # Favourited after both users joined
+        at = np.minimum(np.maximum(joined[src - 1], joined[dst - 1]) + offsets, JOIN_SPAN)
+        _insert(conn, Favourite.__table__, ('user_id_fk', 'fav_user_id_fk', 'created_at'),
+                zip(src.tolist(), dst.tolist(), _timestamps(at)))
+        counts['favorites'] += len(src)
+        progress(f"favorites: {counts['favorites']}")
+
+    total = int(users * reports)
+    reasons = _texts(rng, TEXT_POOL, 8)
+    reporters = rng.integers(1, users + 1, total)
+    reported = popularity.draw(rng, total)
+    keep = reporters != reported
+    at = np.sort(rng.integers(0, JOIN_SPAN, int(keep.sum())))
+    _insert(conn, Report.__table__, ('reporter_id_fk', 'reported_user_id_fk', 'reason', 'created_at'),
+            zip(reporters[keep].tolist(), reported[keep].tolist(), _pick(rng, reasons, len(at)), _timestamps(at)))
+    counts['reports'] = len(at)
+    progress(f"reports: {counts['reports']}")
+    return counts
+
+
+def seed_database(users, favourites=10.0, reports=0.01, extra_profiles=0.0, alpha=0.8,
+                  seed=SEED, password=PASSWORD, replace=False, progress=None):
+    """Fill the database with synthetic users, profiles, favourites and reports.
+
+    User i is `user{i}` and owns profile i; `extra_profiles` of the users
+    get a second profile after those. Users favourite `favourites` others
+    on average, drawn by Popularity. Every user's password is `password`,
+    hashed once. With MATCH_ENGINE = 'table' the stored matches are rebuilt
+    too, which grows with the square of the profile count. Returns
+    {table name: rows} and the seconds taken.
+    """
+    progress = progress or (lambda message: None)
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    chunk_seeds = np.random.SeedSequence(seed).spawn(-(-users // CHUNK_USERS))
+
+    with db.engine.connect() as conn:
+        sqlite = conn.dialect.name == 'sqlite'
+        if sqlite:
+            # The data is regenerated from the seed, so durability can wait until
+            # the end; the pooled connection gets its settings back afterwards
+            pragmas = {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar() for name in ('synchronous', 'cache_size')}
+            conn.exec_driver_sql('PRAGMA synchronous=OFF')
+            conn.exec_driver_sql('PRAGMA cache_size=-262144')
+            conn.commit()
+        try:
+            with conn.begin():
+                if conn.execute(db.select(User.id).limit(1)).first() is not None:
+                    if not replace:
+                        raise DatabaseNotEmpty('The database already has users')
+                    clear_tables(conn)
+                restore = _disable_indexes_and_triggers(conn)
+                counts = _load(conn, rng, chunk_seeds, users, favourites, reports, extra_profiles, alpha,
+                               password, progress)
+                progress('rebuilding indexes')
+                restore(conn)
+                _reset_sequences(conn)
+        finally:
+            if sqlite:
+                for name, value in pragmas.items():
+                    conn.exec_driver_sql(f'PRAGMA {name}={value}')
+                conn.commit()
+
+    progress('rebuilding the full-text index')
+    rebuild_fulltext_index()
+    if current_app.config.get('MATCH_ENGINE', 'vectorized') == 'table':
+        progress('rebuilding stored matches')
+        counts['profile_matches'] = rebuild_profile_matches()
+    from app import cache
+    cache.backend.clear()
+    return counts, time.perf_counter() - started
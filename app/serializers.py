@@ -0,0 +1,200 @@
+from collections import namedtuple
+from flask import has_request_context, request
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import configure_mappers
+from app import db
+from app.models import User, Profile, Favourite, Report
+from app.uploads import photo_urls
+
+# Backref attributes such as Profile.user only exist once mappers are configured
+configure_mappers()
+
+# One key of a serialized object: the column it reads, an optional function
+# applied to the column's value, and the relationship the column is reached
+# through when it belongs to a related row
+Field = namedtuple('Field', 'column convert related', defaults=(None, None))
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+class Serializer:
+    """Pairs a row-to-dict function with the relationships it reads.
+
+    Endpoints pass their query through `load` so every relationship the
+    serializer touches is fetched up front instead of once per row.
+
+    Serializers given `fields` also honour a `?fields=a,b` query parameter:
+    only those keys (plus `id`) are serialized, and `load` restricts the
+    query to the columns they read. `via` is the relationship leading from
+    the queried rows to the serialized object, if they differ.
+
+    They also have a fast path for lists: `select` turns a query into one
+    returning just the needed columns as tuples and `from_rows` builds the
+    dicts from those, without creating ORM objects.
+    """
+
+    def __init__(self, serialize, *loaders, fields=None, via=None):
+        self.serialize = serialize
+        self.loaders = loaders
+        self.fields = fields
+        self.via = via
+
+    def requested_fields(self):
+        """Keys named by ?fields=, or None to serialize everything"""
+        if self.fields is None or not has_request_context():
+            return None
+        value = request.args.get('fields')
+        if not value:
+            return None
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = names - self.fields.keys()
+        if unknown:
+            raise InvalidFields(
+                f'Unknown fields: {", ".join(sorted(unknown))}. Must be among: {", ".join(sorted(self.fields))}'
+            )
+        return ['id'] + sorted(names - {'id'})
+
+    def load(self, query, *columns):
+        """Apply loader options; `columns` are extra columns the view reads itself"""
+        names = self.requested_fields()
+        if names is None:
+            return query.options(*self.loaders) if self.loaders else query
+
+        wanted = list(columns)
+        related = {}
+        for name in names:
+            field = self.fields[name]
+            if field.related is None:
+                wanted.append(field.column)
+            else:
+                related.setdefault(field.related, []).append(field.column)
+        if self.via is None:
+            options = [db.load_only(*wanted)]
+        else:
+            options = [db.joinedload(self.via).load_only(*wanted)]
+        options.extend(db.joinedload(rel).load_only(*cols) for rel, cols in related.items())
+        return query.options(*options)
+
+    def for_request(self):
+        """The object-to-dict function for the current request's fieldset"""
+        names = self.requested_fields()
+        if names is None:
+            return self.serialize
+
+        getters = [(name, self.fields[name]) for name in names]
+        via = self.via.key if self.via is not None else None
+
+        def serialize(obj):
+            if via is not None:
+                obj = getattr(obj, via)
+            data = {}
+            for name, field in getters:
+                value = getattr(obj if field.related is None else getattr(obj, field.related.key), field.column.key)
+                data[name] = field.convert(value) if field.convert else value
+            return data
+
+        return serialize
+
+    def __call__(self, obj):
+        return self.for_request()(obj)
+
+    def many(self, objs):
+        serialize = self.for_request()
+        return [serialize(obj) for obj in objs]
+
+    def _names(self):
+        return self.requested_fields() or list(self.fields)
+
+    def select(self, query):
+        """Rewrite an entity query to select the serialized columns as tuples.
+
+        Related rows (and the `via` target) are joined through aliases, so
+        queries that already join the same tables for filtering or sorting
+        are unaffected.
+        """
+        aliases = {}
+
+        def alias_for(relationship):
+            if relationship not in aliases:
+                aliases[relationship] = db.aliased(relationship.property.mapper.class_)
+                query_joins.append(relationship.of_type(aliases[relationship]))
+            return aliases[relationship]
+
+        query_joins = []
+        target = alias_for(self.via) if self.via is not None else None
+        columns = []
+        for name in self._names():
+            field = self.fields[name]
+            if field.related is not None:
+                columns.append(getattr(alias_for(field.related), field.column.key))
+            elif target is not None:
+                columns.append(getattr(target, field.column.key))
+            else:
+                columns.append(field.column)
+        for join in query_joins:
+            query = query.join(join)
+        return query.with_entities(*columns)
+
+    def for_rows(self):
+        """The row-to-dict function for tuples from a `select`ed query"""
+        names = self._names()
+        if names == ['id']:
+            # paginate unwraps single-column rows into bare values
+            return lambda row: {'id': row[0] if isinstance(row, Row) else row}
+        converted = [(i, name, self.fields[name].convert) for i, name in enumerate(names)
+                     if self.fields[name].convert is not None]
+
+        def serialize(row):
+            data = dict(zip(names, row))
+            for i, name, convert in converted:
+                data[name] = convert(row[i])
+            return data
+
+        return serialize
+
+    def from_rows(self, rows):
+        serialize = self.for_rows()
+        return [serialize(row) for row in rows]
+
+
+def _profile_with_name(profile):
+    profile_dict = profile.to_dict()
+    profile_dict['name'] = profile.user.name  # Add user's name for frontend
+    return profile_dict
+
+
+def _columns(*attrs):
+    return {attr.key: Field(attr) for attr in attrs}
+
+
+# Keys of User.to_dict and Profile.to_dict, by the column each one reads
+USER_FIELDS = dict(
+    _columns(User.id, User.username, User.name, User.email, User.photo),
+    date_joined=Field(User.date_joined, _isoformat),
+)
+PROFILE_FIELDS = dict(
+    _columns(
+        Profile.id, Profile.description, Profile.parish, Profile.biography, Profile.sex,
+        Profile.race, Profile.birth_year, Profile.height, Profile.fav_cuisine, Profile.fav_colour,
+        Profile.fav_school_subject, Profile.political, Profile.religious, Profile.family_oriented,
+        Profile.is_complete, Profile.photo,
+    ),
+    user_id=Field(Profile.user_id_fk),
+    created_at=Field(Profile.created_at, _isoformat),
+    photo_thumb=Field(Profile.photo, lambda photo: photo_urls(photo)['thumb']),
+    photo_medium=Field(Profile.photo, lambda photo: photo_urls(photo)['medium']),
+)
+PROFILE_WITH_NAME_FIELDS = dict(PROFILE_FIELDS, name=Field(User.name, related=Profile.user))
+
+user = Serializer(User.to_dict, fields=USER_FIELDS)
+profile = Serializer(Profile.to_dict, fields=PROFILE_FIELDS)
+profile_with_name = Serializer(_profile_with_name, db.joinedload(Profile.user), fields=PROFILE_WITH_NAME_FIELDS)
+favourite_user = Serializer(lambda fav: fav.favorite_user.to_dict(), db.joinedload(Favourite.favorite_user),
+                            fields=USER_FIELDS, via=Favourite.favorite_user)
+report = Serializer(Report.to_dict, db.joinedload(Report.reporter), db.joinedload(Report.reported_user))
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Written as one JSON object per line; kept out of the app's own log
+logger = logging.getLogger(__name__)
+logger.propagate = False
+
+ROUTES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'routes') + os.sep
+REDACTED = '<redacted>'
+MAX_VALUE_LENGTH = 200
+
+# Statements worth asking the database to plan
+EXPLAINABLE = ('select', 'with', 'update', 'delete')
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r'\?|%\(\w+\)s|%s')
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def normalize(statement):
+    """The statement with literals and placeholders replaced by ?, IN lists folded"""
+    statement = _PLACEHOLDERS.sub('?', _LITERALS.sub('?', statement))
+    return _SPACE.sub(' ', _LISTS.sub('(?, ...)', statement)).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def _origin():
+    """The innermost app/routes frame that led to the query, if any"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_filename.startswith(ROUTES_DIR):
+            path = os.path.relpath(frame.f_code.co_filename, os.path.dirname(ROUTES_DIR[:-1]))
+            return f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def redact(parameters, sensitive):
+    """Bound parameters safe to log: sensitive names masked, long values cut"""
+    def clean(name, value):
+        if name is None or any(word in name.lower() for word in sensitive):
+            return REDACTED
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return f'<{len(value)} bytes>'
+        if isinstance(value, str) and len(value) > MAX_VALUE_LENGTH:
+            return value[:MAX_VALUE_LENGTH] + '...'
+        return value if isinstance(value, (int, float, bool, type(None))) else str(value)
+
+    if isinstance(parameters, dict):
+        return {name: clean(name, value) for name, value in parameters.items()}
+    # Positional parameters without names can't be vetted
+    return [clean(None, value) for value in parameters]
+
+
+def _explain(conn, cursor, statement, parameters):
+    """EXPLAIN QUERY PLAN on SQLite, EXPLAIN elsewhere, on the query's own connection"""
+    dialect = conn.dialect.name
+    raw = cursor.connection
+    explain_cursor = raw.cursor()
+    postgres = dialect == 'postgresql'
+    try:
+        if postgres:
+            # A failed EXPLAIN must not abort the request's transaction
+            explain_cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+            explain_cursor.execute(prefix + statement, parameters)
+            rows = explain_cursor.fetchall()
+        finally:
+            if postgres:
+                explain_cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        explain_cursor.close()
+    if dialect == 'sqlite':
+        return [row[-1] for row in rows]  # (id, parent, notused, detail)
+    return [str(row[0]) for row in rows]
+
+
+def _record(normalized, duration):
+    key = fingerprint(normalized)
+    with _fingerprints_lock:
+        stats = _fingerprints.get(key)
+        if stats is None:
+            stats = _fingerprints[key] = {
+                'fingerprint': key, 'statement': normalized, 'count': 0,
+                'total_seconds': 0.0, 'max_seconds': 0.0, 'plan': None,
+            }
+        stats['count'] += 1
+        stats['total_seconds'] += duration
+        stats['max_seconds'] = max(stats['max_seconds'], duration)
+        return stats
+
+
+def fingerprint_stats():
+    """Slow statements seen by this process, most total time first"""
+    with _fingerprints_lock:
+        stats = [dict(entry) for entry in _fingerprints.values()]
+    return sorted(stats, key=lambda entry: entry['total_seconds'], reverse=True)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _check_duration(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('slow_query_start')
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    if not has_request_context():
+        return
+    settings = current_app.extensions.get('slow_queries')
+    if settings is None or duration < settings['threshold']:
+        return
+    origin = _origin()
+    if origin is None:
+        return
+
+    normalized = normalize(statement)
+    stats = _record(normalized, duration)
+    if stats['plan'] is None and settings['explain'] and not executemany \
+            and normalized.lstrip('(').lower().startswith(EXPLAINABLE):
+        # Once per fingerprint and process; plans rarely change between runs
+        stats['plan'] = _explain(conn, cursor, statement, parameters)
+
+    compiled = getattr(context, 'compiled_parameters', None) if context is not None and context.compiled else None
+    logged = compiled[0] if compiled else (parameters[0] if executemany and parameters else parameters)
+    logger.info(json.dumps({
+        'time': datetime.now(timezone.utc).isoformat(),
+        'duration_ms': round(duration * 1000, 3),
+        'fingerprint': stats['fingerprint'],
+        'occurrences': stats['count'],
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.path,
+        'origin': origin,
+        'statement': statement,
+        'parameters': redact(logged or (), settings['redact']),
+        'executemany': executemany,
+        'plan': stats['plan'],
+    }, default=str))
+
+
+def read_log(path, backups):
+    """Entries from the slow-query log and its rotated backups, oldest first"""
+    paths = [f'{path}.{n}' for n in range(backups, 0, -1)] + [path]
+    for log_path in paths:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash or rotation
+
+
+def init_app(app):
+    """Log statements slower than SLOW_QUERY_THRESHOLD issued from route handlers"""
+    path = app.config.get('SLOW_QUERY_LOG')
+    if not path:
+        return
+    app.extensions['slow_queries'] = {
+        'threshold': app.config['SLOW_QUERY_THRESHOLD'],
+        'explain': app.config.get('SLOW_QUERY_EXPLAIN', True),
+        'redact': tuple(word.lower() for word in app.config.get('SLOW_QUERY_REDACT', ())),
+    }
+    path = os.path.abspath(path)
+    if any(getattr(handler, 'baseFilename', None) == path for handler in logger.handlers):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = RotatingFileHandler(
+        path, maxBytes=app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+        backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'], encoding='utf-8', delay=True,
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
@@ -0,0 +1,48 @@
+from flask import Response, current_app, request, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_stream():
+    """True if the client asked for a streamed export instead of a page"""
+    if request.args.get('stream') in ('1', 'true', 'ndjson'):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def wants_ndjson():
+    return request.args.get('stream') == 'ndjson' or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def stream_query(query, serialize):
+    """Stream every row of an ordered query as a JSON array or NDJSON.
+
+    Rows are fetched STREAM_CHUNK_SIZE at a time with yield_per and written
+    out chunk by chunk, so memory stays flat however many rows there are.
+    """
+    chunk_size = current_app.config['STREAM_CHUNK_SIZE']
+    dumps = current_app.json.dumps
+    ndjson = wants_ndjson()
+
+    def generate():
+        if not ndjson:
+            yield '['
+        chunk = []
+        first = True
+        for row in query.yield_per(chunk_size):
+            item = dumps(serialize(row))
+            if ndjson:
+                chunk.append(item + '\n')
+            else:
+                chunk.append(item if first else ',' + item)
+                first = False
+            if len(chunk) >= chunk_size:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+        if not ndjson:
+            yield ']'
+
+    mimetype = NDJSON_MIMETYPE if ndjson else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
@@ -0,0 +1,230 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import abort, current_app, request, send_from_directory
+from werkzeug.security import safe_join
+from PIL import Image, ImageOps
+
+UPLOAD_FOLDER = 'uploads/profile_photos'
+UPLOAD_URL = '/api/profiles/uploads'
+
+# Extension stored for each accepted image format, read from the bytes
+# rather than the client's filename so identical uploads share one file
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+# Resized copies made for every photo: (width, height, crop to fill)
+VARIANTS = {
+    'thumb': (150, 150, True),
+    'medium': (600, 600, False),
+}
+
+_VARIANT_NAME = re.compile(r'^(?P<stem>[^/_]+)_(?P<variant>[a-z]+)\.(?P<ext>[a-z]+)$')
+_CONTENT_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+# Seconds a browser may reuse an original served in place of a variant
+# that hasn't been made yet
+FALLBACK_MAX_AGE = 60
+
+_executor = None
+
+
+class PhotoTooLarge(ValueError):
+    pass
+
+
+class InvalidPhoto(ValueError):
+    pass
+
+
+def upload_dir(app=None):
+    return os.path.join((app or current_app).root_path, UPLOAD_FOLDER)
+
+
+def variant_filename(filename, variant):
+    stem, ext = filename.rsplit('.', 1)
+    return f'{stem}_{variant}.{ext}'
+
+
+def original_filename(filename):
+    """The original a variant filename was made from, or None"""
+    match = _VARIANT_NAME.match(filename)
+    if match is None or match.group('variant') not in VARIANTS:
+        return None
+    return f"{match.group('stem')}.{match.group('ext')}"
+
+
+def photo_urls(photo):
+    """URLs of every variant of a stored photo URL, keyed by variant name"""
+    if not photo or not photo.startswith(UPLOAD_URL + '/'):
+        return {variant: photo for variant in VARIANTS}
+    filename = photo[len(UPLOAD_URL) + 1:]
+    return {variant: f'{UPLOAD_URL}/{variant_filename(filename, variant)}' for variant in VARIANTS}
+
+
+def serve_photo(filename):
+    """Response for an uploaded photo or one of its variants.
+
+    Stored names never change content (hash- or uuid-named), so responses
+    are marked immutable; hash-named files use the hash as a strong ETag.
+    Conditional and range requests are answered here, or the transfer is
+    handed to the front proxy when UPLOAD_SENDFILE is set.
+    """
+    folder = upload_dir()
+    max_age = current_app.config['PHOTO_MAX_AGE']
+    immutable = True
+    original = original_filename(filename)
+    # Variants are made in the background; serve the original until they exist
+    if original and not os.path.exists(os.path.join(folder, filename)):
+        filename, max_age, immutable = original, FALLBACK_MAX_AGE, False
+
+    stem = filename.rsplit('.', 1)[0]
+    etag = stem if _CONTENT_HASH.match(stem.split('_')[0]) else True
+
+    mode = current_app.config['UPLOAD_SENDFILE']
+    if mode:
+        response = _offload(folder, filename, mode)
+        if etag is True:
+            response.add_etag()
+        else:
+            response.set_etag(etag)
+    else:
+        response = send_from_directory(folder, filename, etag=etag, max_age=max_age, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = immutable
+    return response.make_conditional(request) if mode else response
+
+
+def _offload(folder, filename, mode):
+    """Empty response telling nginx (X-Accel-Redirect) or Apache/lighttpd
+    (X-Sendfile) to send the file itself"""
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    response = current_app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    if mode == 'x-accel':
+        prefix = current_app.config['UPLOAD_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f'{prefix}/{filename}'
+    elif mode == 'x-sendfile':
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    else:
+        raise ValueError(f'Unknown UPLOAD_SENDFILE: {mode}')
+    response.last_modified = os.stat(path).st_mtime
+    return response
+
+
+def save_photo(file):
+    """Stream an uploaded photo to disk and return its URL.
+
+    The upload is written in UPLOAD_CHUNK_SIZE chunks while being hashed and
+    is named by its SHA-256, so identical photos are stored once. Raises
+    PhotoTooLarge past MAX_PHOTO_SIZE bytes and InvalidPhoto if the bytes
+    aren't an accepted image. Variants are made on a background pool.
+    """
+    folder = upload_dir()
+    os.makedirs(folder, exist_ok=True)
+    chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+    max_size = current_app.config['MAX_PHOTO_SIZE']
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise PhotoTooLarge(f'Photo exceeds {max_size} bytes')
+                digest.update(chunk)
+                out.write(chunk)
+
+        try:
+            with Image.open(tmp_path) as image:
+                image_format = image.format
+        except (OSError, Image.DecompressionBombError):
+            raise InvalidPhoto('Photo is not a readable image')
+        if image_format not in FORMAT_EXTENSIONS:
+            raise InvalidPhoto(f'Unsupported image format: {image_format}')
+
+        filename = f'{digest.hexdigest()}.{FORMAT_EXTENSIONS[image_format]}'
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    schedule_variants(filename)
+    return f'{UPLOAD_URL}/{filename}'
+
+
+def _get_executor(app):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=app.config['PHOTO_WORKERS'], thread_name_prefix='photo-variants'
+        )
+    return _executor
+
+
+def schedule_variants(filename):
+    app = current_app._get_current_object()
+    future = _get_executor(app).submit(make_variants, upload_dir(app), filename)
+
+    def log_failure(future):
+        # Until the variants exist their URLs fall back to the original, so
+        # the log is the only place a failure shows up
+        if not future.cancelled() and future.exception() is not None:
+            app.logger.error('Making variants of %s failed', filename, exc_info=future.exception())
+
+    future.add_done_callback(log_failure)
+    return future
+
+
+def make_variants(folder, filename):
+    """Write every missing variant of a stored photo; returns the names written"""
+    written = []
+    source = os.path.join(folder, filename)
+    missing = [v for v in VARIANTS if not os.path.exists(os.path.join(folder, variant_filename(filename, v)))]
+    if not missing:
+        return written
+
+    with Image.open(source) as image:
+        image_format = image.format
+        if image_format not in FORMAT_EXTENSIONS:
+            return written
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGBA' if image_format != 'JPEG' else 'RGB')
+        for variant in missing:
+            width, height, crop = VARIANTS[variant]
+            if crop:
+                resized = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+            name = variant_filename(filename, variant)
+            fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.part')
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    if image_format == 'JPEG':
+                        resized.save(out, image_format, quality=85, optimize=True)
+                    else:
+                        resized.save(out, image_format, optimize=True)
+                os.replace(tmp_path, os.path.join(folder, name))
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            written.append(name)
+    return written
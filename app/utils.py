@@ -1,19 +1,94 @@
+import time
 from functools import wraps
-from flask import jsonify
-from flask_jwt_extended import get_jwt_identity
+from flask import current_app, g, has_app_context, jsonify, request
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import db
 from app.models import User
+from app.replicas import READ_METHODS
+
+# Per-worker cache of user ids known to have a complete profile, mapped to
+# when the entry expires. Only positive results are cached, so a profile
+# completed through another worker is seen on the next request.
+_complete_profiles = {}
+
+def forget_profile_completeness(user_id):
+    _complete_profiles.pop(str(user_id), None)
+
+@event.listens_for(User.profile_complete, 'set')
+def _profile_complete_changed(user, value, oldvalue, initiator):
+    if not value and user.id is not None:
+        forget_profile_completeness(user.id)
+
+def _has_complete_profile(user_id, cached=True):
+    now = time.monotonic()
+    expires = _complete_profiles.get(user_id)
+    if cached and expires is not None and expires > now:
+        return True
+    
+    complete = db.session.query(User.profile_complete).filter(User.id == user_id).scalar()
+    if complete:
+        _complete_profiles[user_id] = now + current_app.config['PROFILE_CACHE_TTL']
+    else:
+        _complete_profiles.pop(user_id, None)
+    return bool(complete)
 
 def profile_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user or not user.has_complete_profile():
+        user_id = str(get_jwt_identity())
+        if request.method in READ_METHODS:
+            # Tokens issued once the profile was complete carry has_profile, so
+            # most reads need no query at all
+            allowed = get_jwt().get('has_profile') or _has_complete_profile(user_id)
+        else:
+            # The claim and this worker's cache outlive a deleted user, so
+            # writes always ask the database
+            allowed = _has_complete_profile(user_id, cached=False)
+        if not allowed:
             return jsonify({
                 'message': 'You must complete your profile before accessing this feature'
             }), 403
         
         return f(*args, **kwargs)
     
-    return decorated_function 
\ No newline at end of file
+    return decorated_function 
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'query_count' in g:
+        g.query_count += 1
+
+def query_budget(max_queries):
+    """Declare how many SQL statements an endpoint may issue.
+
+    Going over the budget usually means an N+1 pattern has crept back in.
+    It raises QueryBudgetExceeded when QUERY_BUDGET_ENFORCE is set (the
+    tests in tests/test_query_budget.py do) and logs a warning otherwise.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            outer = g.pop('query_count', None)
+            g.query_count = 0
+            try:
+                response = f(*args, **kwargs)
+            finally:
+                count = g.pop('query_count', 0)
+                if outer is not None:
+                    g.query_count = outer + count
+            
+            if count > max_queries:
+                message = f'{f.__name__} issued {count} queries, budget is {max_queries}'
+                if current_app.config.get('QUERY_BUDGET_ENFORCE'):
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(message)
+            return response
+        
+        return decorated_function
+    
+    return decorator
@@ -0,0 +1 @@
+# Empty file to make the benchmarks directory a Python package (python -m benchmarks.run)
@@ -0,0 +1,57 @@
+"""Deterministic benchmark datasets in SQLite files under benchmarks/data/.
+
+Generated by the `flask seed` generator (app/seeding.py): user i is
+`user{i}` with password PASSWORD and owns profile i, so a logged-in
+user's profile id is their user id.
+"""
+import os
+from flask_migrate import upgrade
+from app import create_app, db
+from app.seeding import FIRST_NAMES, RACES, SEXES, WORDS, seed_database
+from config import Config, basedir
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+SEED = 3180
+PASSWORD = 'benchmark'
+FAVOURITES_PER_USER = 5
+REPORTS_PER_USER = 0.02
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+MIGRATIONS_DIR = os.path.join(basedir, 'migrations')
+
+
+def parse_size(value):
+    """Profile count from '10k', '100k', '1m' or a plain number"""
+    return SIZES.get(value.lower()) or int(value.replace('_', ''))
+
+
+def dataset_path(profiles, seed=SEED):
+    return os.path.join(DATA_DIR, f'profiles-{profiles}-seed{seed}.db')
+
+
+def build(profiles, seed=SEED, force=False):
+    """Create the dataset for `profiles` profiles unless it already exists; return its path"""
+    path = dataset_path(profiles, seed)
+    if os.path.exists(path) and not force:
+        return path
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # Built under a temporary name so an interrupted build is never reused
+    partial = path + '.partial'
+    for stale in (path, partial):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    class DatasetConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + partial
+        SQLALCHEMY_REPLICA_URIS = []
+        CACHE_BACKEND = 'null'
+        SLOW_QUERY_LOG = ''
+
+    app = create_app(DatasetConfig)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+        seed_database(profiles, favourites=FAVOURITES_PER_USER, reports=REPORTS_PER_USER, seed=seed,
+                      password=PASSWORD)
+        db.engine.dispose()
+    os.replace(partial, path)
+    return path
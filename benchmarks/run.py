@@ -0,0 +1,470 @@
+"""Benchmark the API's hot endpoints against a generated dataset.
+
+Builds (or reuses) a deterministic dataset of the requested size, then
+drives each scenario in-process through Flask's test client, or over HTTP
+against a gunicorn it starts (--gunicorn) or one already running (--url).
+Each scenario records p50/p95/p99 latency, throughput and SQL statements
+per request. Results are saved as JSON and compared with the stored
+baseline for the same size and mode. A regression beyond --tolerance, or
+any increase in statements per request, fails the run, as does a missing
+baseline or one recorded with other settings (unless
+--allow-missing-baseline). Latency and throughput are only compared with a
+baseline recorded on the same kind of machine; statement counts and errors
+always are, so the committed baselines work anywhere.
+
+    python -m benchmarks.run [--size 10k|100k|1m] [--requests N] [--concurrency N]
+                             [--gunicorn WORKERS | --url URL] [--save-baseline]
+                             [--statements-only] [--allow-missing-baseline]
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import re
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from benchmarks import dataset
+from config import Config, basedir
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+BASELINES_DIR = os.path.join(BENCH_DIR, 'baselines')
+
+REQUESTS = 200
+WARMUP = 20
+CONCURRENCY = 1
+TOLERANCE = 0.25
+# Users logged in up front whose tokens the authenticated scenarios use
+TOKEN_POOL = 50
+SERVER_START_TIMEOUT = 60
+
+# The endpoint each scenario exercises, as labelled in /metrics
+SCENARIOS = {
+    'login': 'auth.login',
+    'search': 'search.search_profiles',
+    'matches': 'profiles.get_matches',
+    'favourites': 'users.get_top_n_favourited',
+    'reports': 'reports.get_reports',
+}
+
+
+def _login_request(rng, users, profiles):
+    user_id = rng.randint(1, profiles)
+    return 'POST', '/api/auth/login', {'username': f'user{user_id}', 'password': dataset.PASSWORD}, None
+
+
+def _search_request(rng, users, profiles):
+    _, token = rng.choice(users)
+    filters = rng.choice((
+        lambda: {'sex': rng.choice(dataset.SEXES)},
+        lambda: {'sex': rng.choice(dataset.SEXES), 'race': rng.choice(dataset.RACES)},
+        lambda: {'birth_year': rng.randint(1960, 2005)},
+        lambda: {'q': rng.choice(dataset.WORDS)},
+        lambda: {'name': rng.choice(dataset.FIRST_NAMES), 'sex': rng.choice(dataset.SEXES)},
+    ))()
+    return 'GET', '/api/search?' + urlencode(filters), None, token
+
+
+def _matches_request(rng, users, profiles):
+    user_id, token = rng.choice(users)
+    return 'GET', f'/api/profiles/matches/{user_id}', None, token  # profile id == user id
+
+
+def _favourites_request(rng, users, profiles):
+    _, token = rng.choice(users)
+    query = urlencode({'sort_by': rng.choice(('name', 'favorite_count')), 'order': rng.choice(('asc', 'desc'))})
+    return 'GET', f'/api/users/favourites/{rng.choice((10, 20, 50))}?{query}', None, token
+
+
+def _reports_request(rng, users, profiles):
+    _, token = rng.choice(users)
+    query = urlencode({'sort_by': rng.choice(('created_at', 'reporter_name', 'reason'))})
+    return 'GET', f'/api/reports?{query}', None, token
+
+
+REQUEST_MAKERS = {
+    'login': _login_request,
+    'search': _search_request,
+    'matches': _matches_request,
+    'favourites': _favourites_request,
+    'reports': _reports_request,
+}
+
+_local = threading.local()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    _local.queries = getattr(_local, 'queries', 0) + 1
+
+
+def _server_env(db_path):
+    """Settings shared by the in-process app and a spawned gunicorn"""
+    cache_path = db_path + '.cache'
+    if os.path.exists(cache_path):
+        os.remove(cache_path)  # every run starts from a cold cache
+    return {
+        'DATABASE_URL': 'sqlite:///' + db_path,
+        'DATABASE_REPLICA_URLS': '',
+        'CACHE_SQLITE_PATH': cache_path,
+        'SLOW_QUERY_LOG': '',
+        'METRICS_TOKEN': os.environ.get('METRICS_TOKEN') or secrets.token_urlsafe(),
+    }
+
+
+class InProcessClient:
+    """Requests through Flask's test client; SQL statements are counted exactly"""
+
+    def __init__(self, db_path):
+        from app import create_app
+        env = _server_env(db_path)
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = env['DATABASE_URL']
+            SQLALCHEMY_REPLICA_URIS = []
+            CACHE_SQLITE_PATH = env['CACHE_SQLITE_PATH']
+            SLOW_QUERY_LOG = env['SLOW_QUERY_LOG']
+
+        self.app = create_app(BenchConfig)
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        _local.queries = 0
+        response = client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_data(), _local.queries
+
+    def query_counts(self):
+        return None
+
+
+class HttpClient:
+    """Requests over keep-alive HTTP connections, one per thread.
+
+    Statement counts come from the server's /metrics, read with its
+    METRICS_TOKEN. Each gunicorn worker keeps its own, so with several
+    workers they cover a sample of requests.
+    """
+
+    def __init__(self, url, metrics_token=None):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.metrics_token = metrics_token
+        self.local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        return connection
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = json.dumps(body) if body is not None else None
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.read(), None
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+
+    def query_counts(self):
+        """{endpoint: [requests, statements]} as reported by /metrics"""
+        if not self.metrics_token:
+            return None
+        status, body, _ = self.request('GET', '/metrics', token=self.metrics_token)
+        if status != 200:
+            return None
+        counts = {}
+        for line in body.decode().splitlines():
+            match = re.match(r'^(http_requests_total|db_queries_total)\{(.*)\} (\S+)$', line)
+            if not match:
+                continue
+            labels = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2)))
+            entry = counts.setdefault(labels['endpoint'], [0, 0])
+            entry[0 if match.group(1) == 'http_requests_total' else 1] += float(match.group(3))
+        return counts
+
+
+class Gunicorn:
+    """A local gunicorn serving the app against the benchmark dataset"""
+
+    def __init__(self, db_path, workers):
+        self.env = dict(os.environ, **_server_env(db_path))
+        self.workers = workers
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        self.url = f'http://127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(self.workers),
+             '--bind', f'127.0.0.1:{self.port}', 'run:app'],
+            cwd=basedir, env=self.env,
+        )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f'gunicorn exited with status {self.process.returncode}')
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=1):
+                    return self.url
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise SystemExit(f'gunicorn did not start within {SERVER_START_TIMEOUT} s')
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def login_pool(client, profiles, size, seed):
+    """(user_id, token) for `size` distinct users"""
+    rng = random.Random(seed)
+    users = []
+    for user_id in rng.sample(range(1, profiles + 1), min(size, profiles)):
+        status, body, _ = client.request(
+            'POST', '/api/auth/login', {'username': f'user{user_id}', 'password': dataset.PASSWORD}
+        )
+        if status != 200:
+            raise SystemExit(f'Logging in user{user_id} failed with {status}: {body[:200]!r}')
+        users.append((user_id, json.loads(body)['access_token']))
+    return users
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def run_scenario(client, name, users, profiles, requests, warmup, concurrency, seed):
+    rng = random.Random(f'{seed}:{name}')
+    make_request = REQUEST_MAKERS[name]
+    planned = [make_request(rng, users, profiles) for _ in range(warmup + requests)]
+    for planned_request in planned[:warmup]:
+        client.request(*planned_request)
+
+    def send(planned_request):
+        start = time.perf_counter()
+        status, _, queries = client.request(*planned_request)
+        return time.perf_counter() - start, status, queries
+
+    before = client.query_counts()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, planned[warmup:]))
+    elapsed = time.perf_counter() - start
+    after = client.query_counts()
+
+    latencies = sorted(latency * 1000 for latency, _, _ in results)
+    if before is not None and after is not None:
+        handled, statements = (
+            after.get(SCENARIOS[name], [0, 0])[i] - before.get(SCENARIOS[name], [0, 0])[i] for i in (0, 1)
+        )
+        queries = {'mean': statements / handled, 'max': None} if handled else None
+    elif results[0][2] is not None:
+        counts = [count for _, _, count in results]
+        queries = {'mean': sum(counts) / len(counts), 'max': max(counts)}
+    else:
+        queries = None
+    return {
+        'endpoint': SCENARIOS[name],
+        'requests': len(results),
+        'errors': sum(1 for _, status, _ in results if status >= 400),
+        'throughput_rps': len(results) / elapsed,
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1],
+        },
+        'queries_per_request': queries,
+    }
+
+
+def compare(results, baseline, tolerance, timings=True):
+    """Regressions of `results` against `baseline`, as messages; `timings` includes latency and throughput"""
+    problems = []
+    for name, result in results['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        p95, base_p95 = result['latency_ms']['p95'], base['latency_ms']['p95']
+        if timings and p95 > base_p95 * (1 + tolerance):
+            problems.append(f'{name}: p95 {p95:.1f} ms, baseline {base_p95:.1f} ms')
+        if timings and result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            problems.append(f"{name}: {result['throughput_rps']:.1f} req/s, baseline {base['throughput_rps']:.1f} req/s")
+        if result['errors'] > base['errors']:
+            problems.append(f"{name}: {result['errors']} errors, baseline {base['errors']}")
+        queries, base_queries = result['queries_per_request'], base['queries_per_request']
+        if queries and base_queries:
+            # Statement counts don't depend on the machine, so any increase counts
+            for key in ('mean', 'max'):
+                if queries[key] is not None and base_queries[key] is not None \
+                        and queries[key] > base_queries[key] + 1e-9:
+                    problems.append(f'{name}: {queries[key]:.2f} statements per request ({key}), '
+                                    f'baseline {base_queries[key]:.2f}')
+    return problems
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=basedir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_table(results):
+    print(f"{'scenario':<12}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+    for name, result in results['scenarios'].items():
+        latency, queries = result['latency_ms'], result['queries_per_request']
+        statements = f"{queries['mean']:.2f}" if queries else '-'
+        print(f"{name:<12}{result['throughput_rps']:>9.1f}{latency['p50']:>9.2f}{latency['p95']:>9.2f}"
+              f"{latency['p99']:>9.2f}{statements:>9}{result['errors']:>8}")
+
+
+def run(client, mode, args, profiles):
+    started = time.perf_counter()
+    users = login_pool(client, profiles, TOKEN_POOL, args.seed)
+    scenarios = {}
+    for name in args.scenarios:
+        print(f'Running {name} ...')
+        scenarios[name] = run_scenario(
+            client, name, users, profiles, args.requests, args.warmup, args.concurrency, args.seed
+        )
+    return {
+        'meta': {
+            'profiles': profiles,
+            'seed': args.seed,
+            'mode': mode,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+            'duration_seconds': time.perf_counter() - started,
+        },
+        'scenarios': scenarios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', default='10k', help='profiles in the dataset: 10k, 100k, 1m or a number')
+    parser.add_argument('--seed', type=int, default=dataset.SEED, help='seed for the dataset and request mix')
+    parser.add_argument('--requests', type=int, default=REQUESTS, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=WARMUP, help='untimed requests per scenario first')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='requests in flight at once')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenarios to run')
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument('--gunicorn', type=int, metavar='WORKERS', help='start a local gunicorn with this many workers')
+    server.add_argument('--url', help='benchmark a server already running against the dataset '
+                                      '(statement counts need its METRICS_TOKEN in the environment)')
+    parser.add_argument('--rebuild', action='store_true', help='regenerate the dataset even if it exists')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<size>-<mode>-<time>.json)')
+    parser.add_argument('--baseline', help='baseline file (default: benchmarks/baselines/<size>-<mode>.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed fractional p95/throughput regression')
+    parser.add_argument('--statements-only', action='store_true',
+                        help='compare only statements per request and errors, not latency or throughput')
+    parser.add_argument('--allow-missing-baseline', action='store_true',
+                        help='succeed when there is no baseline with the same settings to compare against')
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    profiles = dataset.parse_size(args.size)
+    if args.rebuild or not os.path.exists(dataset.dataset_path(profiles, args.seed)):
+        print(f'Building a dataset of {profiles} profiles ...')
+        start = time.perf_counter()
+        db_path = dataset.build(profiles, args.seed, force=args.rebuild)
+        print(f'  built {db_path} in {time.perf_counter() - start:.1f} s')
+    else:
+        db_path = dataset.dataset_path(profiles, args.seed)
+
+    if args.url:
+        results = run(HttpClient(args.url, os.environ.get('METRICS_TOKEN')), 'http', args, profiles)
+    elif args.gunicorn:
+        gunicorn = Gunicorn(db_path, args.gunicorn)
+        with gunicorn as url:
+            results = run(HttpClient(url, gunicorn.env['METRICS_TOKEN']), f'gunicorn-{args.gunicorn}', args, profiles)
+    else:
+        results = run(InProcessClient(db_path), 'in-process', args, profiles)
+
+    _print_table(results)
+    mode = results['meta']['mode']
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    output = args.output or os.path.join(RESULTS_DIR, f'{profiles}-{mode}-{stamp}.json')
+    baseline_path = args.baseline or os.path.join(BASELINES_DIR, f'{profiles}-{mode}.json')
+    for path in (output, baseline_path) if args.save_baseline else (output,):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Wrote {path}')
+    if args.save_baseline:
+        return 0
+
+    # Without a comparable baseline nothing was checked, which mustn't pass silently
+    missing = 0 if args.allow_missing_baseline else 1
+    if not os.path.exists(baseline_path):
+        print(f'No baseline at {baseline_path}; run with --save-baseline to record one')
+        return missing
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    settings = ('profiles', 'seed', 'mode', 'requests', 'concurrency')
+    if any(baseline['meta'].get(key) != results['meta'][key] for key in settings):
+        print(f"Baseline was recorded with different settings ({', '.join(settings)}); not comparing")
+        return missing
+    # Timings only mean something on the machine that recorded them
+    machine = ('platform', 'python', 'cpus')
+    timings = not args.statements_only and all(baseline['meta'].get(key) == results['meta'][key] for key in machine)
+    if not timings:
+        print('Comparing statements per request and errors only'
+              + ('' if args.statements_only else ' (baseline is from another machine)'))
+    problems = compare(results, baseline, args.tolerance, timings)
+    if problems:
+        print(f"Regressions against {baseline_path} (revision {baseline['meta'].get('revision')}):")
+        for problem in problems:
+            print(f'  {problem}')
+        return 1
+    print(f'No regressions against {baseline_path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,7 +5,83 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
     SECRET_KEY = 'your-secret-key-here'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'app.db')
+    # DATABASE_URL overrides the local SQLite file (postgres:// is accepted too)
+    SQLALCHEMY_DATABASE_URI = (os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'app.db'))\
+        .replace('postgres://', 'postgresql://', 1)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Read replicas for GET requests, comma-separated (see app/replicas.py), and
+    # how long after committing a write a user's reads stay on the primary
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+    READ_YOUR_WRITES_WINDOW = int(os.environ.get('READ_YOUR_WRITES_WINDOW', 5))
+    # Connection pool (see app/database.py); pre-ping and recycle apply to Postgres
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') not in ('0', 'false', 'False')
+    # Log a warning when a request waits longer than this (seconds) for a connection
+    DB_POOL_SLOW_WAIT = float(os.environ.get('DB_POOL_SLOW_WAIT', 0.5))
+    # SQLite pragmas set on every new connection: WAL lets readers and the
+    # writer proceed concurrently, busy_timeout (ms) waits out locks
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
     JWT_SECRET_KEY = 'super-secret-jwt-key'
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=2)
\ No newline at end of file
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=2)
+    # Matching engine for /api/profiles/matches: 'vectorized', 'sql', 'table' or 'loop'.
+    # Only 'table' keeps profile_matches up to date on profile writes; that table
+    # grows quadratically (two rows per matching pair, ~6M rows for 20k profiles)
+    MATCH_ENGINE = 'vectorized'
+    # Seconds before a worker rebuilds its in-memory match index
+    MATCH_INDEX_TTL = 30
+    # Page sizes for paginated list endpoints
+    PAGE_SIZE = 50
+    MATCHES_PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 100
+    # Rows fetched per round trip when streaming an export (?stream=1)
+    STREAM_CHUNK_SIZE = 1000
+    # Seconds a worker trusts a cached "profile is complete" result
+    PROFILE_CACHE_TTL = 300
+    # Response cache: 'sqlite' (shared by all workers, with an in-process LRU
+    # in front), 'memory' (per worker) or 'null'
+    CACHE_BACKEND = 'sqlite'
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', os.path.join(basedir, 'instance', 'cache.db'))
+    CACHE_MAX_ENTRIES = 1024
+    CACHE_DEFAULT_TIMEOUT = 60
+    # Seconds a cached page of search results stays valid; writes to matching
+    # profiles invalidate it sooner
+    SEARCH_CACHE_TIMEOUT = 300
+    # Photo uploads: largest accepted photo, bytes read per write while
+    # streaming it to disk, and threads making thumbnail/medium variants
+    MAX_PHOTO_SIZE = 5 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE = 64 * 1024
+    PHOTO_WORKERS = 2
+    # Reject oversized request bodies before they're parsed (photo plus form fields)
+    MAX_CONTENT_LENGTH = MAX_PHOTO_SIZE + 1024 * 1024
+    # Browser cache lifetime for uploaded photos, whose names never change content
+    PHOTO_MAX_AGE = 365 * 24 * 3600
+    # Hand photo transfers to the front proxy: None, 'x-accel' (nginx; files
+    # mapped under UPLOAD_ACCEL_PREFIX by an internal location) or 'x-sendfile'
+    UPLOAD_SENDFILE = os.environ.get('UPLOAD_SENDFILE') or None
+    UPLOAD_ACCEL_PREFIX = '/internal/uploads/'
+    # JSON responses of at least this many bytes are compressed (brotli when
+    # the optional brotli package is installed, otherwise gzip)
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 6
+    # Encode JSON responses with orjson when it's installed (optional dependency)
+    JSON_USE_ORJSON = True
+    # Instrument requests and serve Prometheus metrics at /metrics (per process)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') not in ('0', 'false', 'False')
+    # Scrapers must send 'Authorization: Bearer <METRICS_TOKEN>'; unset, /metrics
+    # answers 404 to everyone (requests are still instrumented)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+    # Statements from route handlers slower than this (seconds) go to SLOW_QUERY_LOG
+    # as JSON lines with redacted parameters and the query plan; empty path disables
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD', 0.1))
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', os.path.join(basedir, 'instance', 'slow_queries.log'))
+    SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS = 5
+    SLOW_QUERY_EXPLAIN = True
+    # Bound parameters whose names contain any of these are logged as <redacted>
+    SLOW_QUERY_REDACT = ('password', 'token', 'secret', 'email')
\ No newline at end of file
@@ -26,10 +26,16 @@ export const fetchProfileById = (profileId) => api.get(`/profiles/${profileId}`)
 export const addProfile = (profileData) => api.post('/profiles/', profileData)
 
 /**
- * Search for profiles by criteria.
+ * Search for profiles by criteria, a page at a time.
+ * Pass the `x-next-cursor` header of the previous page as `params.cursor` to fetch the next one.
  */
 export const searchProfiles = (params) => api.get('/search/', { params })
 
+/**
+ * Count matching profiles per sex, race, parish and birth decade.
+ */
+export const getSearchFacets = (params) => api.get('/search/facets', { params })
+
 /**
  * Mark a profile as favourite for the logged-in user.
  */
@@ -37,15 +43,18 @@ export const favouriteProfile = (userId, favUserId) =>
   api.post(`/profiles/${userId}/favourite`, { fav_user_id: favUserId })
 
 /**
- * Get matches for a profile by ID.
+ * Get a page of matches for a profile by ID, best match first.
+ * Pass the `x-next-cursor` header of the previous page as `cursor` to fetch the next one.
  */
-export const getProfileMatches = (profileId) => api.get(`/profiles/matches/${profileId}`)
+export const getProfileMatches = (profileId, params = {}) =>
+  api.get(`/profiles/matches/${profileId}`, { params })
 
 /**
- * Get all users favoured by a user.
+ * Get a page of the users favoured by a user.
+ * Pass the `x-next-cursor` header of the previous page as `cursor` to fetch the next one.
  */
-export const getUserFavourites = (userId, sort_by = 'name', order = 'asc') =>
-  api.get(`/users/${userId}/favourites`, { params: { sort_by, order } })
+export const getUserFavourites = (userId, sort_by = 'name', order = 'asc', cursor = undefined) =>
+  api.get(`/users/${userId}/favourites`, { params: { sort_by, order, cursor } })
 
 /**
  * Get the top N most favoured users.
@@ -12,7 +12,8 @@ import api from './api'
 export const createReport = (data) => api.post('/reports/', data)
 
 /**
- * Fetch all reports with optional sorting.
- * @param {Object} params - Query parameters for sorting (sort_by and order)
+ * Fetch a page of reports with optional sorting.
+ * @param {Object} params - Query parameters for sorting (sort_by and order), and the
+ *   `x-next-cursor` header of the previous page as `cursor` to fetch the next one
  */
 export const fetchReports = (params = {}) => api.get('/reports/', { params }) 
\ No newline at end of file
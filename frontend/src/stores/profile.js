@@ -24,11 +24,15 @@ export const useProfileStore = defineStore('profile', {
     profiles: [],
     lastProfiles: [],
     searchResults: [],
+    searchParams: {},
+    searchCursor: null,
     profileDetails: null,
     favourites: [],
+    favouritesCursor: null,
     topFavourites: [],
     matches: [],
     loading: false,
+    loadingMore: false,
     error: null,
   }),
 
@@ -105,7 +109,9 @@ export const useProfileStore = defineStore('profile', {
       this.error = null
       try {
         const res = await searchProfiles(params)
+        this.searchParams = params
         this.searchResults = res.data
+        this.searchCursor = res.headers['x-next-cursor'] || null
       } catch (err) {
         this.error = err
       } finally {
@@ -113,6 +119,24 @@ export const useProfileStore = defineStore('profile', {
       }
     },
 
+    /**
+     * Append the next page of the last search's results, if there is one.
+     */
+    async loadMoreSearchResults() {
+      if (!this.searchCursor) return
+      this.loadingMore = true
+      this.error = null
+      try {
+        const res = await searchProfiles({ ...this.searchParams, cursor: this.searchCursor })
+        this.searchResults = [...this.searchResults, ...res.data]
+        this.searchCursor = res.headers['x-next-cursor'] || null
+      } catch (err) {
+        this.error = err
+      } finally {
+        this.loadingMore = false
+      }
+    },
+
     /**
      * Mark a profile as favourite for the logged-in user.
      */
@@ -146,7 +170,7 @@ export const useProfileStore = defineStore('profile', {
     },
 
     /**
-     * Get all users favoured by a user.
+     * Get the first page of users favoured by a user.
      */
     async loadFavourites(userId) {
       this.loading = true
@@ -154,6 +178,7 @@ export const useProfileStore = defineStore('profile', {
       try {
         const res = await getUserFavourites(userId)
         this.favourites = res.data
+        this.favouritesCursor = res.headers['x-next-cursor'] || null
       } catch (err) {
         this.error = err
       } finally {
@@ -161,6 +186,24 @@ export const useProfileStore = defineStore('profile', {
       }
     },
 
+    /**
+     * Append the next page of a user's favourites, if there is one.
+     */
+    async loadMoreFavourites(userId) {
+      if (!this.favouritesCursor) return
+      this.loadingMore = true
+      this.error = null
+      try {
+        const res = await getUserFavourites(userId, 'name', 'asc', this.favouritesCursor)
+        this.favourites = [...this.favourites, ...res.data]
+        this.favouritesCursor = res.headers['x-next-cursor'] || null
+      } catch (err) {
+        this.error = err
+      } finally {
+        this.loadingMore = false
+      }
+    },
+
     /**
      * Get the top N most favoured users.
      */
@@ -1,108 +1,266 @@
-from app import create_app, db
-from app.models import User, Profile, Favourite, Report
+"""Copy the application's data from one database to another, normally the
+local SQLite file to Postgres.
+
+Tables are streamed in primary-key order, CHUNK_SIZE rows at a time, and
+bulk-loaded with COPY on Postgres (executemany elsewhere). Each chunk is
+committed together with a per-table checkpoint in the target, so an
+interrupted run resumes where it stopped. Tables whose foreign keys are
+already loaded are copied in parallel. Sequences are reset and the
+full-text index rebuilt at the end.
+
+    python migrate_db.py [--source URL] [--target URL] [--chunk-size N] [--workers N] [--restart]
+"""
+import argparse
+import io
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from flask_migrate import upgrade
+from sqlalchemy import Column, Integer, MetaData, String, Table, Boolean, create_engine, inspect, select, text, tuple_
+from sqlalchemy import column as column_clause, table as table_clause
 
 # Load environment variables
 load_dotenv()
 
-def migrate_data():
-    # Create Flask app
-    app = create_app()
-    
+from app import create_app, db
+from app.fulltext import FTS_TABLE, rebuild_fulltext_index
+from config import Config, basedir
+
+CHUNK_SIZE = 5000
+WORKERS = 4
+MIGRATIONS_DIR = os.path.join(basedir, 'migrations')
+
+# Progress of each table, stored in the target next to the data it describes
+checkpoints = Table(
+    '_migration_checkpoints', MetaData(),
+    Column('table_name', String(100), primary_key=True),
+    Column('last_key', String(200)),
+    Column('rows', Integer, nullable=False, default=0),
+    Column('done', Boolean, nullable=False, default=False),
+)
+
+# Triggers maintaining the full-text index; rebuilt in one pass after loading instead
+POSTGRES_FTS_TRIGGERS = {'profiles': 'profiles_fts_refresh', 'users': 'users_fts_refresh'}
+
+
+def stages(tables):
+    """Group tables so each group only references tables in earlier groups"""
+    level = {}
+    for table in tables:  # sorted_tables lists referenced tables first
+        parents = [fk.column.table for fk in table.foreign_keys if fk.column.table is not table]
+        level[table] = 1 + max((level[p] for p in parents), default=-1)
+    groups = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for table, n in level.items():
+        groups[n].append(table)
+    return groups
+
+
+def _schema_revision(engine):
+    with engine.connect() as conn:
+        if not inspect(conn).has_table('alembic_version'):
+            return None
+        return conn.execute(text('SELECT version_num FROM alembic_version')).scalar()
+
+
+def source_tables(source):
+    """The app's tables that exist in the source, referenced tables first.
+
+    A source at an older revision lacks the tables added since, e.g.
+    profile_matches; the target is upgraded to the same revision, so
+    those are left out on both sides.
+    """
+    existing = set(inspect(source).get_table_names())
+    return [table for table in db.metadata.sorted_tables if table.name in existing]
+
+
+def prepare_target(source, target_url, restart):
+    """Bring the target schema to the source's revision and set up checkpoints.
+
+    Returns the app configured for the target and the target engine.
+    """
+    revision = _schema_revision(source)
+    if revision is None:
+        raise SystemExit('The source database has no alembic_version; run flask db upgrade on it first')
+
+    class TargetConfig(Config):
+        SQLALCHEMY_DATABASE_URI = target_url
+        SQLALCHEMY_REPLICA_URIS = []
+        CACHE_BACKEND = 'null'
+
+    app = create_app(TargetConfig)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR, revision=revision)
+
+    # Tables load in parallel; on SQLite, writers queue on the file lock
+    connect_args = {'timeout': 60} if target_url.startswith('sqlite') else {}
+    target = create_engine(target_url, connect_args=connect_args)
+    with target.begin() as conn:
+        checkpoints.create(conn, checkfirst=True)
+        if restart or not conn.execute(select(checkpoints.c.table_name)).first():
+            # A fresh run replaces whatever the target holds, children first
+            for table in reversed(source_tables(source)):
+                conn.execute(table.delete())
+            conn.execute(checkpoints.delete())
+    return app, target
+
+
+def _load_checkpoint(conn, table):
+    row = conn.execute(select(checkpoints).where(checkpoints.c.table_name == table.name)).first()
+    if row is None:
+        return None, 0, False
+    return (json.loads(row.last_key) if row.last_key else None), row.rows, row.done
+
+
+def _save_checkpoint(conn, table, last_key, rows, done):
+    conn.execute(checkpoints.delete().where(checkpoints.c.table_name == table.name))
+    conn.execute(checkpoints.insert().values(
+        table_name=table.name, last_key=json.dumps(last_key, default=str), rows=rows, done=done
+    ))
+
+
+def _csv_value(value):
+    if value is None:
+        return ''  # an unquoted empty field is NULL in COPY's CSV format
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy(conn, table, columns, rows):
+    """Bulk-load rows into a Postgres table with COPY ... FROM STDIN"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join(_csv_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    names = ', '.join(f'"{name}"' for name in columns)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY "{table.name}" ({names}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+def copy_table(source, target, table, chunk_size):
+    """Copy one table in primary-key order, resuming from its checkpoint"""
+    with target.connect() as conn:
+        last_key, copied, done = _load_checkpoint(conn, table)
+    if done:
+        return table.name, copied, 0.0
+
+    source_columns = {column['name'] for column in inspect(source).get_columns(table.name)}
+    columns = [column for column in table.columns if column.name in source_columns]
+    names = [column.name for column in columns]
+    key = list(table.primary_key.columns)
+    key_index = [names.index(column.name) for column in key]
+    postgres = target.dialect.name == 'postgresql'
+    # Only the copied columns: the model's Python-side defaults may name
+    # columns the target's revision doesn't have yet
+    insert = table_clause(table.name, *[column_clause(name) for name in names]).insert()
+
+    start = time.perf_counter()
+    with source.connect() as reader:
+        while True:
+            query = select(*columns).order_by(*key).limit(chunk_size)
+            if last_key is not None:
+                query = query.where(tuple_(*key) > tuple_(*last_key))
+            rows = reader.execute(query).all()
+            if not rows:
+                break
+
+            last_key = [rows[-1][i] for i in key_index]
+            copied += len(rows)
+            with target.begin() as conn:
+                if postgres:
+                    _copy(conn, table, names, rows)
+                else:
+                    conn.execute(insert, [dict(zip(names, row)) for row in rows])
+                _save_checkpoint(conn, table, last_key, copied, done=False)
+            print(f'  {table.name}: {copied} rows')
+
+    with target.begin() as conn:
+        _save_checkpoint(conn, table, last_key, copied, done=True)
+    return table.name, copied, time.perf_counter() - start
+
+
+def reset_sequences(target, tables):
+    """Point each serial primary key's sequence past the copied ids"""
+    if target.dialect.name != 'postgresql':
+        return
+    with target.begin() as conn:
+        for table in tables:
+            key = list(table.primary_key.columns)
+            if len(key) != 1 or not isinstance(key[0].type, Integer):
+                continue
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', '{key[0].name}'), "
+                f"COALESCE(MAX({key[0].name}), 1), MAX({key[0].name}) IS NOT NULL) FROM {table.name}"
+            ))
+
+
+def _has_fulltext_index(target):
+    return inspect(target).has_table(FTS_TABLE)
+
+
+def _set_fts_triggers(target, enabled):
+    if target.dialect.name != 'postgresql' or not _has_fulltext_index(target):
+        return  # SQLite triggers can't be disabled; they keep the index current as rows arrive
+    with target.begin() as conn:
+        for table, trigger in POSTGRES_FTS_TRIGGERS.items():
+            conn.execute(text(f'ALTER TABLE {table} {"ENABLE" if enabled else "DISABLE"} TRIGGER {trigger}'))
+
+
+def rebuild_fulltext(app, target):
+    """Fill the Postgres index skipped by the disabled triggers, the same way `flask search reindex` does"""
+    if target.dialect.name != 'postgresql' or not _has_fulltext_index(target):
+        return
     with app.app_context():
-        # Get all data from SQLite
-        users = User.query.all()
-        profiles = Profile.query.all()
-        favourites = Favourite.query.all()
-        reports = Report.query.all()
-        
-        # Store the data
-        user_data = [{
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'password_hash': user.password_hash,
-            'name': user.name,
-            'photo': user.photo,
-            'date_joined': user.date_joined
-        } for user in users]
-        
-        profile_data = [{
-            'id': profile.id,
-            'user_id_fk': profile.user_id_fk,
-            'description': profile.description,
-            'parish': profile.parish,
-            'biography': profile.biography,
-            'sex': profile.sex,
-            'race': profile.race,
-            'birth_year': profile.birth_year,
-            'height': profile.height,
-            'fav_cuisine': profile.fav_cuisine,
-            'fav_colour': profile.fav_colour,
-            'fav_school_subject': profile.fav_school_subject,
-            'political': profile.political,
-            'religious': profile.religious,
-            'family_oriented': profile.family_oriented,
-            'created_at': profile.created_at,
-            'is_complete': profile.is_complete,
-            'photo': profile.photo
-        } for profile in profiles]
-        
-        favourite_data = [{
-            'id': fav.id,
-            'user_id_fk': fav.user_id_fk,
-            'fav_user_id_fk': fav.fav_user_id_fk,
-            'created_at': fav.created_at
-        } for fav in favourites]
-        
-        report_data = [{
-            'id': report.id,
-            'reporter_id_fk': report.reporter_id_fk,
-            'reported_user_id_fk': report.reported_user_id_fk,
-            'reason': report.reason,
-            'created_at': report.created_at
-        } for report in reports]
-        
-        # Switch to PostgreSQL database
-        app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+        rebuild_fulltext_index()
         db.session.remove()
-        db.get_engine().dispose()
-        
-        # Drop all tables and recreate them
-        db.drop_all()
-        db.create_all()
-        
-        # Import data to PostgreSQL
-        for user in user_data:
-            new_user = User(**user)
-            db.session.add(new_user)
-        
-        # Commit users first
-        db.session.commit()
-        
-        # Now add profiles
-        for profile in profile_data:
-            new_profile = Profile(**profile)
-            db.session.add(new_profile)
-        
-        # Commit profiles
-        db.session.commit()
-        
-        # Add favourites
-        for favourite in favourite_data:
-            new_favourite = Favourite(**favourite)
-            db.session.add(new_favourite)
-        
-        # Add reports
-        for report in report_data:
-            new_report = Report(**report)
-            db.session.add(new_report)
-        
-        # Final commit
-        db.session.commit()
-        
-        print("Migration completed successfully!")
+
+
+def migrate_data(source_url, target_url, chunk_size=CHUNK_SIZE, workers=WORKERS, restart=False):
+    if not target_url:
+        raise SystemExit('No target database: pass --target or set DATABASE_URL')
+    source = create_engine(source_url)
+    app, target = prepare_target(source, target_url, restart)
+    tables = source_tables(source)
+
+    started = time.perf_counter()
+    _set_fts_triggers(target, enabled=False)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for group in stages(tables):
+                print(f"Copying {', '.join(table.name for table in group)}")
+                jobs = [pool.submit(copy_table, source, target, table, chunk_size) for table in group]
+                for job in jobs:
+                    name, rows, elapsed = job.result()
+                    print(f'  {name}: done, {rows} rows' + (f' in {elapsed:.1f} s' if elapsed else ' (already copied)'))
+    finally:
+        _set_fts_triggers(target, enabled=True)
+
+    reset_sequences(target, tables)
+    rebuild_fulltext(app, target)
+    with target.begin() as conn:
+        checkpoints.drop(conn)
+    print(f'Migration completed successfully in {time.perf_counter() - started:.1f} s!')
+
 
 if __name__ == '__main__':
-    migrate_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--source', default='sqlite:///' + os.path.join(basedir, 'app.db'),
+                        help='database to copy from (default: the local app.db)')
+    parser.add_argument('--target', default=os.getenv('DATABASE_URL'),
+                        help='database to copy into (default: $DATABASE_URL)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows read and written per batch')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='tables copied at once')
+    parser.add_argument('--restart', action='store_true', help='ignore checkpoints and copy everything again')
+    args = parser.parse_args()
+    target_url = args.target.replace('postgres://', 'postgresql://', 1) if args.target else None
+    migrate_data(args.source, target_url, args.chunk_size, args.workers, args.restart)
@@ -0,0 +1,28 @@
+"""Add profile matching indexes
+
+Revision ID: 3f9c2a7d1b64
+Revises: 99e69821dc0d
+Create Date: 2026-10-18 10:12:41.503318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d1b64'
+down_revision = '99e69821dc0d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('profiles', schema=None) as batch_op:
+        batch_op.create_index('ix_profiles_birth_year_height', ['birth_year', 'height'], unique=False)
+        batch_op.create_index('ix_profiles_user_id_fk', ['user_id_fk'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('profiles', schema=None) as batch_op:
+        batch_op.drop_index('ix_profiles_user_id_fk')
+        batch_op.drop_index('ix_profiles_birth_year_height')
@@ -0,0 +1,35 @@
+"""Add favorite_count to users
+
+Revision ID: 5d6b9e3a7f28
+Revises: e2a8f4b61c05
+Create Date: 2026-10-18 14:36:10.372954
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d6b9e3a7f28'
+down_revision = 'e2a8f4b61c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ALTER TABLE so the users table is not recreated (see e2a8f4b61c05)
+    op.add_column('users', sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_index(op.f('ix_users_favorite_count'), 'users', ['favorite_count'], unique=False)
+
+    users = sa.table('users', sa.column('id', sa.Integer()), sa.column('favorite_count', sa.Integer()))
+    favorites = sa.table('favorites', sa.column('id', sa.Integer()), sa.column('fav_user_id_fk', sa.Integer()))
+    op.execute(users.update().values(favorite_count=(
+        sa.select(sa.func.count(favorites.c.id))
+        .where(favorites.c.fav_user_id_fk == users.c.id)
+        .scalar_subquery()
+    )))
+
+
+def downgrade():
+    op.drop_index(op.f('ix_users_favorite_count'), table_name='users')
+    op.drop_column('users', 'favorite_count')
@@ -0,0 +1,36 @@
+"""Add profile_matches table
+
+Revision ID: 8b41e6f0c2d9
+Revises: 3f9c2a7d1b64
+Create Date: 2026-10-18 11:04:17.228915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41e6f0c2d9'
+down_revision = '3f9c2a7d1b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('profile_matches',
+    sa.Column('profile_id_fk', sa.Integer(), nullable=False),
+    sa.Column('match_profile_id_fk', sa.Integer(), nullable=False),
+    sa.Column('matched_fields', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['match_profile_id_fk'], ['profiles.id'], ),
+    sa.ForeignKeyConstraint(['profile_id_fk'], ['profiles.id'], ),
+    sa.PrimaryKeyConstraint('profile_id_fk', 'match_profile_id_fk')
+    )
+    with op.batch_alter_table('profile_matches', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_profile_matches_match_profile_id_fk'), ['match_profile_id_fk'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('profile_matches', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_profile_matches_match_profile_id_fk'))
+
+    op.drop_table('profile_matches')
@@ -0,0 +1,112 @@
+"""Add profile full-text index
+
+Revision ID: c7d05e9a4f13
+Revises: 8b41e6f0c2d9
+Create Date: 2026-10-18 12:21:08.640177
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d05e9a4f13'
+down_revision = '8b41e6f0c2d9'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_UPGRADE = [
+    """CREATE VIRTUAL TABLE profiles_fts USING fts5(
+        name, description, biography, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER profiles_fts_insert AFTER INSERT ON profiles BEGIN
+        INSERT INTO profiles_fts (rowid, name, description, biography)
+        SELECT new.id, users.name, new.description, new.biography FROM users WHERE users.id = new.user_id_fk;
+    END""",
+    """CREATE TRIGGER profiles_fts_update AFTER UPDATE OF user_id_fk, description, biography ON profiles BEGIN
+        DELETE FROM profiles_fts WHERE rowid = old.id;
+        INSERT INTO profiles_fts (rowid, name, description, biography)
+        SELECT new.id, users.name, new.description, new.biography FROM users WHERE users.id = new.user_id_fk;
+    END""",
+    """CREATE TRIGGER profiles_fts_delete AFTER DELETE ON profiles BEGIN
+        DELETE FROM profiles_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER users_fts_update AFTER UPDATE OF name ON users BEGIN
+        UPDATE profiles_fts SET name = new.name
+        WHERE rowid IN (SELECT id FROM profiles WHERE user_id_fk = new.id);
+    END""",
+    """INSERT INTO profiles_fts (rowid, name, description, biography)
+        SELECT p.id, u.name, p.description, p.biography FROM profiles p JOIN users u ON u.id = p.user_id_fk""",
+]
+
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER users_fts_update',
+    'DROP TRIGGER profiles_fts_delete',
+    'DROP TRIGGER profiles_fts_update',
+    'DROP TRIGGER profiles_fts_insert',
+    'DROP TABLE profiles_fts',
+]
+
+# Name, description and biography are weighted A, B and C so name-only
+# searches can filter on weight A
+POSTGRES_UPGRADE = [
+    """CREATE TABLE profiles_fts (
+        profile_id INTEGER PRIMARY KEY REFERENCES profiles (id) ON DELETE CASCADE,
+        document TSVECTOR NOT NULL
+    )""",
+    'CREATE INDEX ix_profiles_fts_document ON profiles_fts USING GIN (document)',
+    """CREATE FUNCTION profiles_fts_refresh() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO profiles_fts (profile_id, document)
+        SELECT NEW.id,
+               setweight(to_tsvector('simple', u.name), 'A') ||
+               setweight(to_tsvector('simple', NEW.description), 'B') ||
+               setweight(to_tsvector('simple', NEW.biography), 'C')
+        FROM users u WHERE u.id = NEW.user_id_fk
+        ON CONFLICT (profile_id) DO UPDATE SET document = EXCLUDED.document;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER profiles_fts_refresh AFTER INSERT OR UPDATE OF user_id_fk, description, biography
+        ON profiles FOR EACH ROW EXECUTE FUNCTION profiles_fts_refresh()""",
+    """CREATE FUNCTION users_fts_refresh() RETURNS trigger AS $$
+    BEGIN
+        UPDATE profiles_fts f
+        SET document = setweight(to_tsvector('simple', NEW.name), 'A') ||
+                       setweight(to_tsvector('simple', p.description), 'B') ||
+                       setweight(to_tsvector('simple', p.biography), 'C')
+        FROM profiles p
+        WHERE p.user_id_fk = NEW.id AND f.profile_id = p.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER users_fts_refresh AFTER UPDATE OF name ON users
+        FOR EACH ROW EXECUTE FUNCTION users_fts_refresh()""",
+    """INSERT INTO profiles_fts (profile_id, document)
+        SELECT p.id,
+               setweight(to_tsvector('simple', u.name), 'A') ||
+               setweight(to_tsvector('simple', p.description), 'B') ||
+               setweight(to_tsvector('simple', p.biography), 'C')
+        FROM profiles p JOIN users u ON u.id = p.user_id_fk""",
+]
+
+POSTGRES_DOWNGRADE = [
+    'DROP TRIGGER users_fts_refresh ON users',
+    'DROP FUNCTION users_fts_refresh()',
+    'DROP TRIGGER profiles_fts_refresh ON profiles',
+    'DROP FUNCTION profiles_fts_refresh()',
+    'DROP TABLE profiles_fts',
+]
+
+
+def upgrade():
+    statements = POSTGRES_UPGRADE if op.get_bind().dialect.name == 'postgresql' else SQLITE_UPGRADE
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade():
+    statements = POSTGRES_DOWNGRADE if op.get_bind().dialect.name == 'postgresql' else SQLITE_DOWNGRADE
+    for statement in statements:
+        op.execute(statement)
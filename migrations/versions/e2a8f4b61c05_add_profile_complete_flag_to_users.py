@@ -0,0 +1,34 @@
+"""Add profile_complete flag to users
+
+Revision ID: e2a8f4b61c05
+Revises: c7d05e9a4f13
+Create Date: 2026-10-18 13:47:52.915064
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a8f4b61c05'
+down_revision = 'c7d05e9a4f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ALTER TABLE rather than batch mode: recreating users on SQLite
+    # would break the full-text index triggers that reference it
+    op.add_column('users', sa.Column('profile_complete', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.create_index(op.f('ix_users_profile_complete'), 'users', ['profile_complete'], unique=False)
+
+    users = sa.table('users', sa.column('id', sa.Integer()), sa.column('profile_complete', sa.Boolean()))
+    profiles = sa.table('profiles', sa.column('user_id_fk', sa.Integer()), sa.column('is_complete', sa.Boolean()))
+    op.execute(users.update().values(profile_complete=sa.exists().where(
+        profiles.c.user_id_fk == users.c.id, profiles.c.is_complete.is_(True)
+    )))
+
+
+def downgrade():
+    op.drop_index(op.f('ix_users_profile_complete'), table_name='users')
+    op.drop_column('users', 'profile_complete')
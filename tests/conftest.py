@@ -0,0 +1,48 @@
+import os
+import pytest
+from flask_migrate import upgrade
+from app import create_app, db
+from app.matching import invalidate_match_index
+from app.seeding import PASSWORD
+from app.utils import _complete_profiles
+from config import Config, basedir
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app over a freshly migrated SQLite database"""
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        SQLALCHEMY_REPLICA_URIS = []
+        CACHE_BACKEND = 'null'
+        SLOW_QUERY_LOG = ''
+        QUERY_BUDGET_ENFORCE = True
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        upgrade(directory=os.path.join(basedir, 'migrations'))
+        # Per-worker caches outlive the previous test's database
+        invalidate_match_index()
+        _complete_profiles.clear()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """Log in as a seeded user and return headers carrying their token"""
+
+    def login(user_id, password=PASSWORD):
+        response = client.post('/api/auth/login', json={'username': f'user{user_id}', 'password': password})
+        assert response.status_code == 200, response.get_json()
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    return login
@@ -0,0 +1,30 @@
+import pytest
+from collections import Counter
+from app.models import Favourite, User
+from app.seeding import seed_database
+
+
+@pytest.fixture
+def headers(app, login):
+    seed_database(300, favourites=3, seed=13)
+    return login(1)
+
+
+def _expected(sort_by, order, n):
+    """The first n favourited users under the sort, ties in id order"""
+    counts = Counter(fav for (fav,) in Favourite.query.with_entities(Favourite.fav_user_id_fk))
+    users = sorted(User.query.filter(User.id.in_(counts)).all(), key=lambda u: u.id)
+    reverse = order == 'desc'
+    if sort_by == 'name':
+        users.sort(key=lambda u: u.name.lower(), reverse=reverse)
+    elif sort_by == 'favorite_count':
+        users.sort(key=lambda u: counts[u.id], reverse=reverse)
+    return [(u.id, counts[u.id]) for u in users[:n]]
+
+
+@pytest.mark.parametrize('sort_by', ('name', 'parish', 'birth_year', 'favorite_count'))
+@pytest.mark.parametrize('order', ('asc', 'desc'))
+def test_top_n_favourited_sorts_then_limits(client, headers, sort_by, order):
+    response = client.get(f'/api/users/favourites/20?sort_by={sort_by}&order={order}', headers=headers)
+    assert response.status_code == 200
+    assert [(u['id'], u['favorite_count']) for u in response.get_json()] == _expected(sort_by, order, 20)
@@ -0,0 +1,116 @@
+import pytest
+from app import db
+from app.matching import (MatchIndex, SCORE_SCALE, count_matched_fields, invalidate_match_index, loop_matches,
+                          match_query, ranked_matches, rebuild_profile_matches, score_key)
+from app.models import Profile, ProfileMatch, User
+from app.seeding import seed_database
+
+ENGINES = ('vectorized', 'sql', 'table', 'loop')
+PAGE_SIZE = 7
+
+# Anchor heights and candidates around the edges of their 3-10 height
+# window. Across 128 the differences are inexact in binary floating point
+# (128.02 - 118.02 is 10.000000000000014, 128.01 - 125.01 is
+# 2.999999999999986), so every engine must compare them as the loop does.
+BOUNDARY_HEIGHTS = {
+    160.1: (150.1, 150.09, 150.11, 157.1, 157.09, 157.11, 163.1, 163.09, 163.11, 170.1, 170.09, 170.11),
+    128.01: (118.01, 125.01),
+    128.02: (118.02, 125.02),
+}
+
+
+def _add_profile(user_id, height, birth_year=1990, **fields):
+    profile = Profile(
+        user_id_fk=user_id, description='Boundary profile', parish='Kingston', biography='Boundary profile',
+        sex='Female', race='Black', birth_year=birth_year, height=height,
+        fav_cuisine=fields.get('fav_cuisine', 'Jamaican'), fav_colour=fields.get('fav_colour', 'Blue'),
+        fav_school_subject=fields.get('fav_school_subject', 'Art'),
+        political=fields.get('political', True), religious=fields.get('religious', False),
+        family_oriented=fields.get('family_oriented', True), is_complete=True,
+    )
+    db.session.add(profile)
+    return profile
+
+
+@pytest.fixture
+def profiles(app):
+    seed_database(200, favourites=2, seed=7)
+    # One user per boundary profile, plus pairs of identical candidates
+    # whose scores tie
+    next_id = db.session.query(db.func.max(User.id)).scalar() + 1
+    heights = [height for anchor, others in BOUNDARY_HEIGHTS.items() for height in (anchor,) + others]
+    heights += [165.1, 165.1, 168.3, 168.3]
+    for offset, height in enumerate(heights):
+        user_id = next_id + offset
+        db.session.add(User(id=user_id, username=f'boundary{user_id}', email=f'boundary{user_id}@example.com',
+                            password_hash='-', name=f'Boundary {user_id}', profile_complete=True))
+        _add_profile(user_id, height)
+    db.session.commit()
+    invalidate_match_index()
+    return Profile.query.order_by(Profile.id).all()
+
+
+def _reference(profile, candidates):
+    """(key, id) pairs of the loop engine's matches, best first"""
+    others = [p for p in candidates if p.user_id_fk != profile.user_id_fk]
+    scored = [(score_key(profile, p.birth_year, p.height, count_matched_fields(profile, p)), p.id)
+              for p in loop_matches(profile, others)]
+    return sorted(scored, key=lambda pair: (-pair[0], pair[1]))
+
+
+def _all_pages(profile):
+    ranked, cursor = [], None
+    while True:
+        page, cursor = ranked_matches(profile, profile.user_id_fk, PAGE_SIZE, cursor)
+        ranked.extend((round(score * SCORE_SCALE), p.id) for p, score in page)
+        if cursor is None:
+            return ranked
+
+
+def test_boundary_heights_are_exercised():
+    differences = {abs(anchor - height) for anchor, others in BOUNDARY_HEIGHTS.items() for height in others}
+    # Each edge of the window exactly, and off by a rounding error either way
+    for edge in (3, 10):
+        assert edge in differences
+        assert any(0 < edge - d < 1e-9 for d in differences)
+        assert any(0 < d - edge < 1e-9 for d in differences)
+
+
+def test_match_ids_and_match_query_agree_with_loop(profiles):
+    index = MatchIndex()
+    for profile in profiles:
+        expected = sorted(pid for _, pid in _reference(profile, profiles))
+        assert index.match_ids(profile, profile.user_id_fk) == expected, profile.id
+        assert [p.id for p in match_query(profile, profile.user_id_fk)] == expected, profile.id
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_ranked_matches_agree_with_loop(app, profiles, engine):
+    app.config['MATCH_ENGINE'] = engine
+    if engine == 'table':
+        rebuild_profile_matches()
+    invalidate_match_index()
+    ties = 0
+    for profile in profiles:
+        expected = _reference(profile, profiles)
+        assert _all_pages(profile) == expected, (engine, profile.id)
+        ties += sum(a[0] == b[0] for a, b in zip(expected, expected[1:]))
+    # Equal scores must come back in id order on every engine
+    assert ties
+
+
+@pytest.mark.parametrize('engine', ('vectorized', 'table'))
+def test_profile_writes_maintain_stored_matches_only_for_table_engine(app, client, login, profiles, engine):
+    app.config['MATCH_ENGINE'] = engine
+    if engine == 'table':
+        rebuild_profile_matches()
+    response = client.post('/api/profiles', headers=login(1), json={
+        'description': 'Second profile', 'parish': 'Kingston', 'biography': 'Second profile', 'sex': 'Male',
+        'race': 'Black', 'birth_year': 1990, 'height': 165.1, 'fav_cuisine': 'Jamaican', 'fav_colour': 'Blue',
+        'fav_school_subject': 'Art', 'political': 'true', 'religious': 'false', 'family_oriented': 'true',
+    })
+    assert response.status_code == 201
+    profile = db.session.get(Profile, response.get_json()['profile']['id'])
+    stored = ProfileMatch.query.filter_by(profile_id_fk=profile.id).count()
+    expected = len(_reference(profile, Profile.query.all())) if engine == 'table' else 0
+    assert stored == expected
@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy.exc import DBAPIError
+from app import db
+from app.metrics import PROMETHEUS_CONTENT_TYPE
+
+
+def test_metrics_closed_without_token(client):
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 404
+
+
+def test_metrics_require_the_configured_token(app, client):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    for authorization in (None, 'Bearer wrong', 's3cret', 'Bearer s3cret2'):
+        headers = {'Authorization': authorization} if authorization else {}
+        assert client.get('/metrics', headers=headers).status_code == 404, authorization
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    assert response.content_type == PROMETHEUS_CONTENT_TYPE
+    assert 'http_requests_total' in response.get_data(as_text=True)
+
+
+def test_failed_statements_leave_no_timer_behind(app):
+    with app.app_context():
+        connection = db.session.connection()
+        for _ in range(3):
+            with pytest.raises(DBAPIError):
+                connection.execute(db.text('SELECT no_such_column FROM users'))
+            db.session.rollback()
+            connection = db.session.connection()
+            assert not connection.info.get('metrics_query_start')
@@ -0,0 +1,51 @@
+import pytest
+from app import db
+from app.models import Favourite, User
+from app.seeding import seed_database
+
+
+@pytest.fixture
+def users(app):
+    seed_database(20, favourites=2, reports=0.1, seed=5)
+
+
+def test_complete_profile_can_favourite(client, login, users):
+    # Undo any favourite the seed drew, keeping the counter in step
+    deleted = db.session.execute(db.text('DELETE FROM favorites WHERE user_id_fk = 3 AND fav_user_id_fk = 7'))
+    db.session.execute(db.text('UPDATE users SET favorite_count = favorite_count - :n WHERE id = 7'),
+                       {'n': deleted.rowcount})
+    db.session.commit()
+    before = db.session.get(User, 7).favorite_count
+
+    response = client.post('/api/profiles/7/favourite', headers=login(3))
+    assert response.status_code == 201
+    assert Favourite.query.filter_by(user_id_fk=3, fav_user_id_fk=7).count() == 1
+    db.session.expire_all()
+    assert db.session.get(User, 7).favorite_count == before + 1
+
+
+def test_deleted_users_token_cannot_write(client, login, users):
+    headers = login(2)
+    # The token carries has_profile and this worker has cached the profile as complete
+    assert client.get('/api/users/1', headers=headers).status_code == 200
+    assert client.delete('/api/users/2', headers=headers).status_code == 200
+
+    response = client.post('/api/profiles/7/favourite', headers=headers)
+    assert response.status_code == 403
+    response = client.post('/api/reports', headers=headers, json={'reported_user_id': 7, 'reason': 'Spam'})
+    assert response.status_code == 403
+    assert Favourite.query.filter_by(user_id_fk=2).count() == 0
+
+
+def test_writes_ignore_a_stale_completeness_cache(app, client, login, users):
+    headers = login(4)
+    assert client.get('/api/users/1', headers=headers).status_code == 200
+    # Deleted behind this worker's back, e.g. by another worker
+    for statement in ('DELETE FROM favorites WHERE user_id_fk = 4 OR fav_user_id_fk = 4',
+                      'DELETE FROM reports WHERE reporter_id_fk = 4 OR reported_user_id_fk = 4',
+                      'DELETE FROM profiles WHERE user_id_fk = 4',
+                      'DELETE FROM users WHERE id = 4'):
+        db.session.execute(db.text(statement))
+    db.session.commit()
+
+    assert client.post('/api/profiles/7/favourite', headers=headers).status_code == 403
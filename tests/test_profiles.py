@@ -0,0 +1,35 @@
+import pytest
+from app.models import Profile
+from app.pagination import NEXT_CURSOR_HEADER
+from app.seeding import seed_database
+
+
+@pytest.fixture
+def headers(app, login):
+    seed_database(150, favourites=2, seed=13)
+    return login(1)
+
+
+@pytest.mark.parametrize('limit, expected', [(100000, 100), (-1, 1), (0, 1), (7, 7)])
+def test_profiles_limit_is_clamped(app, client, headers, limit, expected):
+    assert app.config['MAX_PAGE_SIZE'] == 100
+    response = client.get(f'/api/profiles?limit={limit}', headers=headers)
+    assert response.status_code == 200
+    assert len(response.get_json()) == expected
+    assert NEXT_CURSOR_HEADER in response.headers
+
+
+def test_profiles_pages_cover_every_profile_newest_first(client, headers):
+    seen, url = [], '/api/profiles?limit=40'
+    while url:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        seen += [(p['created_at'], p['id']) for p in response.get_json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        url = f'/api/profiles?limit=40&cursor={cursor}' if cursor else None
+    assert len(seen) == Profile.query.count()
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_profiles_reject_invalid_cursor(client, headers):
+    assert client.get('/api/profiles?cursor=nonsense', headers=headers).status_code == 400
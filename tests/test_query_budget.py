@@ -0,0 +1,77 @@
+import pytest
+from app import db
+from app.matching import rebuild_profile_matches
+from app.models import User
+from app.pagination import NEXT_CURSOR_HEADER
+from app.seeding import seed_database
+from app.utils import QueryBudgetExceeded, query_budget
+
+USERS = 2000
+
+
+@pytest.fixture
+def headers(app, login):
+    # Budget overruns raise instead of logging, so an N+1 fails the request
+    app.config['QUERY_BUDGET_ENFORCE'] = True
+    seed_database(USERS, favourites=10, reports=0.05, extra_profiles=0.2, seed=11)
+    return login(1)
+
+
+def _get_pages(client, headers, url, pages=3):
+    """GET `url` and follow its next-page cursor; returns the rows seen"""
+    rows = []
+    next_url = url
+    for _ in range(pages):
+        response = client.get(next_url, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        rows += response.get_json()
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+        next_url = f"{url}{'&' if '?' in url else '?'}cursor={cursor}"
+    return rows
+
+
+def test_enforced_budget_raises(app):
+    @query_budget(0)
+    def over_budget():
+        return db.session.query(User.id).first()
+
+    app.config['QUERY_BUDGET_ENFORCE'] = True
+    with app.test_request_context():
+        with pytest.raises(QueryBudgetExceeded):
+            over_budget()
+
+
+@pytest.mark.parametrize('url', [
+    '/api/profiles?limit=100',
+    '/api/users',
+    '/api/users/1',
+    '/api/users/favorites',
+    '/api/users/1/favourites?sort_by=name&order=desc',
+    '/api/users/1/favourites?sort_by=parish',
+    '/api/users/favourites/50?sort_by=name',
+    '/api/users/favourites/50?sort_by=favorite_count&order=desc',
+    '/api/users/most-favorited',
+    '/api/search?sex=Female',
+    '/api/search?q=music',
+    '/api/search?name=Keisha&race=Black',
+    '/api/search/facets?sex=Male',
+    '/api/reports',
+    '/api/reports?sort_by=reporter_name&order=asc',
+    '/api/reports?sort_by=reported_user_name',
+    '/api/reports?sort_by=reason',
+])
+def test_list_endpoints_stay_within_budget(client, headers, url):
+    rows = _get_pages(client, headers, url)
+    assert rows
+
+
+@pytest.mark.parametrize('engine', ('vectorized', 'sql', 'table', 'loop'))
+def test_matches_stay_within_budget(app, client, headers, engine):
+    app.config['MATCH_ENGINE'] = engine
+    if engine == 'table':
+        rebuild_profile_matches()
+    # Profile 1 belongs to user 1
+    assert _get_pages(client, headers, '/api/profiles/matches/1?limit=100', pages=2)
+    assert _get_pages(client, headers, '/api/profiles/matches/1?limit=5')
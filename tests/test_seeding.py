@@ -0,0 +1,46 @@
+import pytest
+from app import db
+from app.matching import rebuild_profile_matches
+from app.models import Favourite, Profile, ProfileMatch, Report, User
+from app.seeding import DatabaseNotEmpty, seed_database
+
+
+def _stored_matches():
+    return set(db.session.query(ProfileMatch.profile_id_fk, ProfileMatch.match_profile_id_fk,
+                                ProfileMatch.matched_fields))
+
+
+def test_seed_without_favourites_or_reports(app):
+    counts, _ = seed_database(30, favourites=0, reports=0, seed=3)
+    assert counts == {'users': 30, 'profiles': 30, 'favorites': 0, 'reports': 0}
+    assert (User.query.count(), Profile.query.count(), Favourite.query.count(), Report.query.count()) == (30, 30, 0, 0)
+
+
+def test_replace_rebuilds_stored_matches_for_table_engine(app):
+    app.config['MATCH_ENGINE'] = 'table'
+    counts, _ = seed_database(40, favourites=2, seed=3)
+    assert counts['profile_matches'] == ProfileMatch.query.count() > 0
+
+    with pytest.raises(DatabaseNotEmpty):
+        seed_database(40, favourites=2, seed=4)
+    counts, _ = seed_database(60, favourites=2, seed=4, replace=True)
+    stored = _stored_matches()
+    assert counts['profile_matches'] == len(stored) > 0
+    # The same rows a rebuild from the new data gives
+    rebuild_profile_matches()
+    assert _stored_matches() == stored
+
+
+def test_seed_leaves_stored_matches_alone_for_other_engines(app):
+    counts, _ = seed_database(40, favourites=2, seed=3)
+    assert 'profile_matches' not in counts
+    assert ProfileMatch.query.count() == 0
+
+
+def test_seeded_datetimes_compare_like_bound_ones(app):
+    seed_database(30, favourites=2, reports=0.5, seed=3)
+    for column in (User.date_joined, Profile.created_at, Favourite.created_at, Report.created_at):
+        value = db.session.query(column).order_by(column).limit(1).scalar()
+        # A keyset cursor binds the value it read back, which must find its row again
+        assert db.session.query(column).filter(column == value).count() >= 1, column
+        assert db.session.query(column).filter(column < value).count() == 0, column
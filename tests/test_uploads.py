@@ -0,0 +1,58 @@
+import logging
+import os
+import time
+import pytest
+from PIL import Image
+from app.uploads import UPLOAD_FOLDER, make_variants, schedule_variants, variant_filename
+
+
+@pytest.fixture
+def folder(app, tmp_path):
+    # upload_dir() is relative to the app's root path
+    app.root_path = str(tmp_path)
+    path = tmp_path / UPLOAD_FOLDER
+    path.mkdir(parents=True)
+    return path
+
+
+def _write_photo(folder, name):
+    Image.new('RGB', (800, 400), 'blue').save(folder / name, 'PNG')
+
+
+def test_make_variants_removes_temp_file_on_failure(folder, monkeypatch):
+    _write_photo(folder, 'a.png')
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(Image.Image, 'save', fail)
+    with pytest.raises(OSError):
+        make_variants(str(folder), 'a.png')
+    assert sorted(os.listdir(folder)) == ['a.png']
+
+
+def _logged(caplog):
+    return any('Making variants of broken.png failed' in r.getMessage() and r.exc_info for r in caplog.records)
+
+
+def test_schedule_variants_logs_failures(app, folder, caplog):
+    (folder / 'broken.png').write_bytes(b'not an image')
+    with app.app_context(), caplog.at_level(logging.ERROR):
+        future = schedule_variants('broken.png')
+        with pytest.raises(OSError):
+            future.result(timeout=10)
+        # The worker runs done callbacks just after result() can return
+        deadline = time.monotonic() + 10
+        while not _logged(caplog) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    assert _logged(caplog)
+
+
+def test_photos_variants_continues_past_bad_files(app, folder):
+    (folder / 'a.png').write_bytes(b'not an image')
+    _write_photo(folder, 'b.png')
+    result = app.test_cli_runner().invoke(args=['photos', 'variants'])
+    assert result.exit_code == 1
+    assert 'a.png:' in result.output
+    assert 'Wrote 2 variants' in result.output
+    assert all((folder / variant_filename('b.png', v)).exists() for v in ('thumb', 'medium'))